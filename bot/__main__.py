@@ -22,15 +22,20 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from bot import handlers
 from bot import background_tasks
 from bot.db.base import close_db, create_db_session_pool, init_db
+from bot.delivery import DeliveryEngine
+from bot.job_store import RedisJobStore
 from bot.middlewares.throw_session import ThrowDBSessionMiddleware
 from bot.middlewares.throw_user_model import ThrowUserMiddleware
+from bot.scheduler import Priority
 from bot.scheduler import default_scheduler as scheduler
 from bot.scheduler import logger as scheduler_logger
+from bot.scheduler import metrics_logger as scheduler_metrics_logger
 from bot.settings import Settings, se
 
 load_dotenv()
 
 scheduler_logger.setLevel(logging.ERROR)
+scheduler_metrics_logger.setLevel(logging.INFO)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,14 +47,75 @@ async def start_scheduler(
     redis: Redis,
     bot: Bot,
 ) -> None:
-    scheduler.every(5).seconds.do(
-        background_tasks.send_job_answers,
-        sessionmaker=sessionmaker,
-        bot=bot,
+    scheduler.use_store(RedisJobStore(redis))
+    scheduler.limit_concurrency(se.scheduler_concurrency)
+    delivery = DeliveryEngine(
+        bot,
+        concurrency=se.delivery_concurrency,
+        rate=se.delivery_rate,
+        chat_interval=se.delivery_chat_interval,
     )
-    while True:
-        await scheduler.run_pending()
-        await asyncio.sleep(1)
+    # answers are pushed through the Redis stream; this sweep only catches
+    # whatever the listener missed. In digest mode the sweep is the only
+    # sender and its period is the digest window
+    digest = se.job_answers_digest_seconds
+    (
+        scheduler.every(digest or se.job_answers_sweep_seconds)
+        .seconds.tag("send_job_answers")
+        .priority(Priority.DELIVERY)
+        .overlap(max_instances=1, coalesce=True)
+        .timeout(60)
+        .retry(max_retries=3, base_delay=5, max_delay=60)
+        .circuit_breaker(threshold=10, cooldown=300)
+        .do(
+            background_tasks.send_job_answers,
+            sessionmaker=sessionmaker,
+            delivery=delivery,
+            redis=redis,
+        )
+    )
+    # dead letters have their own slower cadence and a lower priority so
+    # retries of failing chats never hold up the main sweep
+    (
+        scheduler.every(se.job_answers_retry_sweep_seconds)
+        .seconds.tag("send_dead_job_answers")
+        .priority(Priority.DEFAULT)
+        .overlap(max_instances=1, coalesce=True)
+        .timeout(120)
+        .do(
+            background_tasks.send_dead_job_answers,
+            sessionmaker=sessionmaker,
+            delivery=delivery,
+            redis=redis,
+        )
+    )
+    (
+        scheduler.every(se.username_counters_reconcile_minutes)
+        .minutes.tag("reconcile_username_counters")
+        .priority(Priority.HOUSEKEEPING)
+        .overlap(max_instances=1, coalesce=True)
+        .do(background_tasks.reconcile_username_counters, sessionmaker=sessionmaker)
+    )
+    (
+        scheduler.every(se.usernames_archive_minutes)
+        .minutes.tag("archive_sent_usernames")
+        .priority(Priority.HOUSEKEEPING)
+        .overlap(max_instances=1, coalesce=True)
+        .do(background_tasks.archive_sent_usernames, sessionmaker=sessionmaker)
+    )
+    scheduler.every(5).minutes.local().priority(Priority.HOUSEKEEPING).do(
+        scheduler.log_metrics
+    )
+    tasks = [scheduler.run_forever()]
+    if not digest:
+        tasks.append(
+            background_tasks.listen_job_answers(
+                sessionmaker=sessionmaker,
+                delivery=delivery,
+                redis=redis,
+            )
+        )
+    await asyncio.gather(*tasks)
 
 
 async def startup(dispatcher: Dispatcher, bot: Bot, se: Settings, redis: Redis) -> None:
@@ -59,7 +125,11 @@ async def startup(dispatcher: Dispatcher, bot: Bot, se: Settings, redis: Redis)
     await init_db(engine)
 
     dispatcher.workflow_data.update(
-        {"sessionmaker": db_session, "db_session_closer": partial(close_db, engine)}
+        {
+            "sessionmaker": db_session,
+            "db_session_closer": partial(close_db, engine),
+            "redis": redis,
+        }
     )
 
     dispatcher.update.outer_middleware(ThrowDBSessionMiddleware())
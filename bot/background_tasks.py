@@ -1,17 +1,45 @@
 from __future__ import annotations
 
+import asyncio
+import csv
+import datetime
+import itertools
 import logging
-from typing import Final, Iterable
+import os
+import tempfile
+import time
+import uuid
+import zlib
+from typing import TYPE_CHECKING, Any, Final, Iterable, Iterator, Sequence
 
 import msgpack
-from aiogram import Bot
-from sqlalchemy import select
+import msgspec
+from aiogram.types import FSInputFile
+from sqlalchemy import Row, Select, and_, delete, or_, select, update
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from bot.db.models import Account, Job, UserDB
+from bot import job_events
+from bot.db import schemas
+from bot.db.models import Account, Job, JobStatus, UserDB
+from bot.db.schemas import NameEntry
+from bot.db.usernames import archive_sent, reconcile_counters, stamp_sent
+from bot.settings import se
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.delivery import DeliveryEngine
 
 logger = logging.getLogger(__name__)
 minute: Final[int] = 60
+LISTEN_BLOCK_MS: Final[int] = 5_000
+LISTEN_RETRY_SECONDS: Final[int] = 5
+# events delivered at once by the listener; one slow chat holds one slot
+LISTEN_MAX_IN_FLIGHT: Final[int] = 100
+MAX_TG_MESSAGE_LENGTH: Final[int] = 4096
+DEDUPE_KEY_PREFIX: Final[str] = "wb:jobs:delivered"
+DEDUPE_TTL_SECONDS: Final[int] = 24 * 60 * 60
 
 
 def key_build(key: str) -> str:
@@ -28,6 +56,10 @@ def _format_username(value: str | None) -> str:
 
 
 def _format_payload_item(item: object) -> str:
+    if isinstance(item, NameEntry):
+        return " ".join(
+            part for part in (item.name, _format_username(item.username)) if part
+        )
     if isinstance(item, dict):
         name = item.get("name") if isinstance(item.get("name"), str) else None
         username = (
@@ -40,52 +72,587 @@ def _format_payload_item(item: object) -> str:
     return str(item)
 
 
-def _payload_to_text(payload: object) -> str:
-    if isinstance(payload, list):
-        lines: Iterable[str] = (_format_payload_item(item) for item in payload)
-        text = "\n".join(lines).strip()
-        return text or "Ответ задачи пуст"
-    if isinstance(payload, dict):
-        return "\n".join(f"{k}: {v}" for k, v in payload.items())
-    return str(payload)
+# first byte of a msgpack array / map header
+_ARRAY_MARKERS: Final[frozenset[int]] = frozenset((*range(0x90, 0xA0), 0xDC, 0xDD))
+_MAP_MARKERS: Final[frozenset[int]] = frozenset((*range(0x80, 0x90), 0xDE, 0xDF))
 
 
-async def send_job_answers(
-    sessionmaker: async_sessionmaker,
-    bot: Bot,
+def _iter_payload(job_id: int, job_name: str, answer: bytes) -> Iterator[object]:
+    """Decodes a job answer lazily: items of a top-level list one by one,
+    `key: value` lines of a map, or the value itself.
+
+    List items of job kinds registered in bot.db.schemas are decoded into
+    their Struct, each from its own slice of the buffer."""
+    try:
+        view = memoryview(schemas.unwrap(answer, se.job_answers_max_bytes))
+    except ValueError as exc:
+        logger.error("Не удалось распаковать ответ задачи %s: %s", job_id, exc)
+        yield f"Не удалось декодировать ответ: {exc}"
+        return
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=max(len(view), 1))
+    item_type = schemas.answer_item_type(job_name)
+    try:
+        unpacker.feed(view)
+        if not view:
+            yield ""
+        elif view[0] in _ARRAY_MARKERS and item_type is not None:
+            item_decoder = schemas.decoder(item_type)
+            for _ in range(unpacker.read_array_header()):
+                start = unpacker.tell()
+                unpacker.skip()
+                raw = view[start : unpacker.tell()]
+                try:
+                    yield item_decoder.decode(raw)
+                except msgspec.ValidationError as exc:
+                    logger.warning("Элемент ответа задачи %s не по схеме: %s", job_id, exc)
+                    yield msgpack.unpackb(raw, raw=False)
+        elif view[0] in _ARRAY_MARKERS:
+            for _ in range(unpacker.read_array_header()):
+                yield unpacker.unpack()
+        elif view[0] in _MAP_MARKERS:
+            for _ in range(unpacker.read_map_header()):
+                key = unpacker.unpack()
+                yield f"{key}: {unpacker.unpack()}"
+        else:
+            yield unpacker.unpack()
+    except (ValueError, msgpack.UnpackException, msgspec.DecodeError) as exc:
+        logger.exception("Не удалось декодировать ответ задачи %s: %s", job_id, exc)
+        yield f"Не удалось декодировать ответ: {exc}"
+
+
+def _take_head(items: Iterator[object], limit: int) -> tuple[list[object], bool]:
+    """Pulls items until their text exceeds `limit` characters; the flag
+    tells whether the stream ended before that."""
+    head: list[object] = []
+    size = 0
+    for item in items:
+        head.append(item)
+        size += len(_format_payload_item(item)) + 1
+        if size > limit:
+            return head, False
+    return head, True
+
+
+def _split_message(lines: Iterable[str], limit: int) -> Iterator[str]:
+    chunk: list[str] = []
+    size = 0
+    for line in lines:
+        # a single line longer than a message is cut hard
+        while len(line) > limit:
+            if chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            yield line[:limit]
+            line = line[limit:]
+        if chunk and size + 1 + len(line) > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        size += len(line) + (1 if chunk else 0)
+        chunk.append(line)
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def _is_name_item(item: object) -> bool:
+    return isinstance(item, NameEntry) or (
+        isinstance(item, dict) and ("name" in item or "username" in item)
+    )
+
+
+def _write_payload_file(path: str, table: bool, items: Iterable[object]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        if table:
+            writer = csv.writer(fh)
+            writer.writerow(("name", "username"))
+            for item in items:
+                if isinstance(item, NameEntry):
+                    writer.writerow((item.name or "", item.username or ""))
+                elif _is_name_item(item):
+                    writer.writerow((item.get("name") or "", item.get("username") or ""))
+                else:
+                    # items that don't fit the table are kept as text
+                    writer.writerow((_format_payload_item(item), ""))
+            return
+        for item in items:
+            fh.write(_format_payload_item(item))
+            fh.write("\n")
+
+
+async def _send_payload(delivery: DeliveryEngine, chat_id: int, job: Job) -> None:
+    answer = job.answer or b""
+    size = schemas.payload_size(answer)
+    if size > se.job_answers_max_bytes:
+        logger.warning("Ответ задачи %s слишком большой: %s байт", job.id, size)
+        await delivery.send_message(
+            chat_id=chat_id,
+            text=f"Ответ задачи {job.name} слишком большой ({size} байт)",
+        )
+        return
+
+    items = _iter_payload(job.id, job.name, answer)
+    # big answers are unpacked and decoded off the event loop, small ones
+    # are not worth the thread hop
+    offload = size > se.job_answers_offload_bytes
+    limit = se.job_answers_document_threshold
+    if offload:
+        head, complete = await asyncio.to_thread(_take_head, items, limit)
+    else:
+        head, complete = _take_head(items, limit)
+
+    if complete:
+        text = "\n".join(map(_format_payload_item, head)).strip()
+        if not text:
+            await delivery.send_message(chat_id=chat_id, text="Ответ задачи пуст")
+            return
+        for chunk in _split_message(text.splitlines(), MAX_TG_MESSAGE_LENGTH):
+            await delivery.send_message(chat_id=chat_id, text=chunk)
+        return
+
+    table = (
+        schemas.answer_item_type(job.name) is NameEntry or _is_name_item(head[0])
+    )
+    suffix = ".csv" if table else ".txt"
+    fd, path = tempfile.mkstemp(prefix=f"job_{job.id}_", suffix=suffix)
+    os.close(fd)
+    try:
+        # the rest of the stream is decoded while the file is written
+        await asyncio.to_thread(
+            _write_payload_file, path, table, itertools.chain(head, items)
+        )
+        await delivery.send_document(
+            chat_id=chat_id,
+            document=FSInputFile(path, filename=f"{job.name}_{job.id}{suffix}"),
+        )
+    finally:
+        os.unlink(path)
+
+
+def _job_header(job: Job, account: Account) -> str:
+    return f"Результат задачи {job.name} для {account.name or account.phone}"
+
+
+def _digest_lines(jobs: Sequence[tuple[Job, Account]]) -> Iterator[str]:
+    for index, (job, account) in enumerate(jobs):
+        if index:
+            yield ""
+        yield _job_header(job, account)
+        answer = job.answer or b""
+        size = schemas.payload_size(answer)
+        if size > se.job_answers_max_bytes:
+            yield f"Ответ слишком большой ({size} байт)"
+            continue
+        yield from map(_format_payload_item, _iter_payload(job.id, job.name, answer))
+
+
+async def _send_digest(
+    delivery: DeliveryEngine, chat_id: int, jobs: Sequence[tuple[Job, Account]]
 ) -> None:
+    lines = _digest_lines(jobs)
+    offload = (
+        sum(schemas.payload_size(job.answer or b"") for job, _ in jobs)
+        > se.job_answers_offload_bytes
+    )
+    limit = se.job_answers_document_threshold
+    if offload:
+        head, complete = await asyncio.to_thread(_take_head, lines, limit)
+    else:
+        head, complete = _take_head(lines, limit)
+
+    if complete:
+        for chunk in _split_message(head, MAX_TG_MESSAGE_LENGTH):
+            await delivery.send_message(chat_id=chat_id, text=chunk)
+        return
+
+    fd, path = tempfile.mkstemp(prefix=f"digest_{chat_id}_", suffix=".txt")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(
+            _write_payload_file, path, False, itertools.chain(head, lines)
+        )
+        await delivery.send_document(
+            chat_id=chat_id,
+            document=FSInputFile(path, filename=f"results_{len(jobs)}.txt"),
+            caption=f"Результаты задач: {len(jobs)}",
+        )
+    finally:
+        os.unlink(path)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def _answers_stmt() -> Select:
+    return (
+        select(Job, Account, UserDB)
+        .join(Account, Job.account_id == Account.id)
+        .join(UserDB, Account.user_id == UserDB.id)
+        .order_by(Job.id)
+    )
+
+
+def _dedupe_key(job: Job) -> str:
+    # ids can be reused after the top rows are deleted, the checksum cannot
+    return f"{DEDUPE_KEY_PREFIX}:{job.id}:{zlib.crc32(job.answer or b'')}"
+
+
+def _retry_at(job: Job, now: datetime.datetime) -> datetime.datetime | None:
+    if job.attempts >= se.job_answers_max_attempts:
+        return None
+    delay = min(
+        se.job_answers_retry_max_seconds,
+        se.job_answers_retry_base_seconds * 2 ** max(job.attempts - 1, 0),
+    )
+    return now + datetime.timedelta(seconds=delay)
+
+
+async def _claim_answers(
+    session: AsyncSession,
+    token: str,
+    *conditions: Any,
+    limit: int,
+    status: JobStatus = JobStatus.ANSWERED,
+) -> list[int]:
+    """Leases up to `limit` jobs in `status` to `token` and returns the ids
+    that were looked at; rows won by the claim are then selected by
+    claimed_by."""
+    now = _utcnow()
+    claimable = and_(
+        Job.status == status,
+        or_(Job.claimed_until.is_(None), Job.claimed_until < now),
+    )
+    # FOR UPDATE SKIP LOCKED on MySQL; SQLite drops the clause and relies on
+    # its single writer plus the re-checked predicate in the UPDATE
+    candidates = (
+        await session.scalars(
+            select(Job.id)
+            .where(claimable, *conditions)
+            .order_by(Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+    ).all()
+    if candidates:
+        await session.execute(
+            update(Job)
+            .where(Job.id.in_(candidates), claimable)
+            .values(
+                claimed_by=token,
+                claimed_until=now
+                + datetime.timedelta(seconds=se.job_answers_lease_seconds),
+                attempts=Job.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+    return list(candidates)
+
+
+async def _deliver_claimed(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+    *conditions: Any,
+    limit: int,
+    status: JobStatus = JobStatus.ANSWERED,
+) -> list[int]:
+    token = f"{job_events.consumer_name()}:{uuid.uuid4().hex[:8]}"
     async with sessionmaker() as session:
-        stmt = (
-            select(Job, Account, UserDB)
-            .join(Account, Job.account_id == Account.id)
-            .join(UserDB, Account.user_id == UserDB.id)
-            .where(Job.answer.is_not(None))
+        candidates = await _claim_answers(
+            session, token, *conditions, limit=limit, status=status
+        )
+        if not candidates:
+            return candidates
+        stmt = _answers_stmt().where(
+            Job.id.in_(candidates), Job.claimed_by == token
         )
         rows = (await session.execute(stmt)).all()
+    # the lease guards the rows while they are sent, so no transaction or
+    # pooled connection is held through Bot API calls and flood waits
+    delivered = await _deliver_rows(delivery, redis, rows)
+    async with sessionmaker() as session:
+        await _settle_rows(session, token, rows, delivered)
+    return candidates
+
 
+async def _deliver_rows(
+    delivery: DeliveryEngine,
+    redis: Redis,
+    rows: Sequence[Row[tuple[Job, Account, UserDB]]],
+) -> list[int]:
+    if se.job_answers_digest_seconds:
+        by_user: dict[int, list[tuple[Job, Account]]] = {}
+        users: dict[int, UserDB] = {}
         for job, account, user in rows:
-            try:
-                payload = msgpack.unpackb(job.answer, raw=False)
-            except Exception as exc:  # pragma: no cover - guardrail
-                logger.exception(
-                    "Не удалось декодировать ответ задачи %s: %s", job.id, exc
-                )
-                payload = f"Не удалось декодировать ответ: {exc}"
+            by_user.setdefault(user.id, []).append((job, account))
+            users[user.id] = user
+        results = await asyncio.gather(
+            *(
+                _deliver_digest(delivery, redis, users[user_id], jobs)
+                for user_id, jobs in by_user.items()
+            )
+        )
+        delivered = [job_id for ids in results for job_id in ids]
+    else:
+        sent = await asyncio.gather(
+            *(
+                _deliver_once(delivery, redis, job, account, user)
+                for job, account, user in rows
+            )
+        )
+        delivered = [row[0].id for row, ok in zip(rows, sent) if ok]
+    return delivered
 
-            # header = f"Результат задачи {job.name} для {account.name or account.phone}"
-            text = _payload_to_text(payload)
 
-            try:
-                await bot.send_message(chat_id=user.user_id, text=text)
-            except Exception as exc:  # pragma: no cover - network related
-                logger.exception(
-                    "Не удалось отправить результат задачи %s пользователю %s: %s",
-                    job.id,
-                    user.id,
-                    exc,
-                )
+async def _settle_rows(
+    session: AsyncSession,
+    token: str,
+    rows: Sequence[Row[tuple[Job, Account, UserDB]]],
+    delivered: list[int],
+) -> None:
+    """Deletes the delivered jobs and dead-letters the rest of the claim."""
+    delivered_ids = set(delivered)
+    failed = [row[0] for row in rows if row[0].id not in delivered_ids]
+    if failed:
+        now = _utcnow()
+        await session.execute(
+            update(Job)
+            .where(Job.claimed_by == token)
+            .execution_options(synchronize_session=None),
+            [
+                {
+                    "id": job.id,
+                    "status": JobStatus.DEAD,
+                    "claimed_by": None,
+                    "claimed_until": None,
+                    "next_attempt_at": _retry_at(job, now),
+                }
+                for job in failed
+            ],
+        )
+        logger.warning("Ответы задач %s не доставлены", [job.id for job in failed])
+    if delivered:
+        await session.execute(
+            delete(Job)
+            .where(Job.id.in_(delivered), Job.claimed_by == token)
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+
+
+async def _already_delivered(redis: Redis, job: Job) -> bool:
+    key = _dedupe_key(job)
+    try:
+        if await redis.exists(key):
+            logger.info("Ответ задачи %s уже доставлен, удаляем", job.id)
+            return True
+    except Exception as exc:
+        logger.warning("Не удалось проверить ключ доставки %s: %s", key, exc)
+    return False
+
+
+async def _remember_delivered(redis: Redis, *jobs: Job) -> None:
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.set(_dedupe_key(job), 1, ex=DEDUPE_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as exc:
+        logger.warning("Не удалось сохранить ключи доставки: %s", exc)
+
+
+async def _deliver_once(
+    delivery: DeliveryEngine, redis: Redis, job: Job, account: Account, user: UserDB
+) -> bool:
+    if await _already_delivered(redis, job):
+        return True
+    async with delivery.exclusive(user.user_id):
+        if not await _deliver_job(delivery, job, account, user):
+            return False
+    await _remember_delivered(redis, job)
+    return True
+
+
+async def _deliver_digest(
+    delivery: DeliveryEngine,
+    redis: Redis,
+    user: UserDB,
+    jobs: Sequence[tuple[Job, Account]],
+) -> list[int]:
+    done = [job.id for job, _ in jobs if await _already_delivered(redis, job)]
+    fresh = [(job, account) for job, account in jobs if job.id not in done]
+    if not fresh:
+        return done
+    try:
+        async with delivery.exclusive(user.user_id):
+            await _send_digest(delivery, user.user_id, fresh)
+    except Exception as exc:  # pragma: no cover - network related
+        logger.exception(
+            "Не удалось отправить сводку %s задач пользователю %s: %s",
+            len(fresh),
+            user.id,
+            exc,
+        )
+        return done
+    await _remember_delivered(redis, *(job for job, _ in fresh))
+    return done + [job.id for job, _ in fresh]
+
+
+async def _deliver_job(
+    delivery: DeliveryEngine, job: Job, account: Account, user: UserDB
+) -> bool:
+    # header = f"Результат задачи {job.name} для {account.name or account.phone}"
+    try:
+        await _send_payload(delivery, user.user_id, job)
+    except Exception as exc:  # pragma: no cover - network related
+        logger.exception(
+            "Не удалось отправить результат задачи %s пользователю %s: %s",
+            job.id,
+            user.id,
+            exc,
+        )
+        return False
+    return True
+
+
+async def send_job_answers(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+) -> None:
+    """Drains answered jobs chunk by chunk until the sweep budget is spent;
+    the next fire picks up the rest, so the run never reaches its timeout
+    and gets cancelled halfway through a chunk."""
+    chunk_size = se.job_answers_chunk_size
+    deadline = time.monotonic() + se.job_answers_sweep_budget_seconds
+    last_id = 0
+    while time.monotonic() < deadline:
+        candidates = await _deliver_claimed(
+            sessionmaker, delivery, redis, Job.id > last_id, limit=chunk_size
+        )
+        if len(candidates) < chunk_size:
+            return
+        last_id = candidates[-1]
+    logger.info("Бюджет обхода ответов исчерпан, продолжим в следующий запуск")
 
-            await session.delete(job)
 
-        if rows:
-            await session.commit()
+async def send_dead_job_answers(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+) -> None:
+    """Retries dead letters whose next attempt is due, apart from the main
+    sweep so a backlog of failing chats does not hold fresh answers."""
+    chunk_size = se.job_answers_chunk_size
+    deadline = time.monotonic() + se.job_answers_sweep_budget_seconds
+    last_id = 0
+    while time.monotonic() < deadline:
+        candidates = await _deliver_claimed(
+            sessionmaker,
+            delivery,
+            redis,
+            Job.id > last_id,
+            Job.next_attempt_at <= _utcnow(),
+            limit=chunk_size,
+            status=JobStatus.DEAD,
+        )
+        if len(candidates) < chunk_size:
+            return
+        last_id = candidates[-1]
+
+
+async def send_job_answer(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+    job_id: int,
+) -> None:
+    await _deliver_claimed(sessionmaker, delivery, redis, Job.id == job_id, limit=1)
+
+
+async def reconcile_username_counters(sessionmaker: async_sessionmaker) -> None:
+    async with sessionmaker() as session:
+        fixed = await reconcile_counters(session)
+    if fixed:
+        logger.warning("Исправлены счетчики очереди у %s аккаунтов", fixed)
+
+
+async def archive_sent_usernames(sessionmaker: async_sessionmaker) -> None:
+    older_than = _utcnow() - datetime.timedelta(days=se.usernames_archive_after_days)
+    moved = 0
+    async with sessionmaker() as session:
+        await stamp_sent(session)
+        # bounded per run so one sweep never holds the table for long
+        for _ in range(se.usernames_archive_max_batches):
+            batch = await archive_sent(
+                session, older_than, se.usernames_archive_batch_size
+            )
+            moved += batch
+            if batch < se.usernames_archive_batch_size:
+                break
+    if moved:
+        logger.info("В архив перенесено %s отправленных юзернеймов", moved)
+
+
+async def _handle_job_event(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+    message_id: bytes,
+    job_id: int | None,
+) -> None:
+    if job_id is not None:
+        try:
+            await send_job_answer(sessionmaker, delivery, redis, job_id)
+        except Exception as exc:
+            # the row stays in the table for the fallback sweep
+            logger.exception("Не удалось доставить ответ задачи %s: %s", job_id, exc)
+    try:
+        await job_events.ack_job_answers(redis, message_id)
+    except Exception as exc:
+        logger.warning("Не удалось подтвердить событие %s: %s", message_id, exc)
+
+
+async def listen_job_answers(
+    sessionmaker: async_sessionmaker,
+    delivery: DeliveryEngine,
+    redis: Redis,
+) -> None:
+    """Delivers every event in its own task, so a flooded chat holds only
+    its own events; each event is acked once its delivery is done."""
+    consumer = job_events.consumer_name()
+    group_ready = False
+    slots = asyncio.Semaphore(LISTEN_MAX_IN_FLIGHT)
+    in_flight: set[asyncio.Task[None]] = set()
+
+    def _done(task: asyncio.Task[None]) -> None:
+        in_flight.discard(task)
+        slots.release()
+
+    try:
+        while True:
+            try:
+                if not group_ready:
+                    await job_events.ensure_group(redis)
+                    group_ready = True
+                events = await job_events.read_job_answers(
+                    redis, consumer, block_ms=LISTEN_BLOCK_MS
+                )
+                for message_id, job_id in events:
+                    await slots.acquire()
+                    task = asyncio.create_task(
+                        _handle_job_event(
+                            sessionmaker, delivery, redis, message_id, job_id
+                        )
+                    )
+                    in_flight.add(task)
+                    task.add_done_callback(_done)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                group_ready = False
+                logger.exception("Ошибка чтения событий ответов задач: %s", exc)
+                await asyncio.sleep(LISTEN_RETRY_SECONDS)
+    finally:
+        for task in in_flight:
+            task.cancel()
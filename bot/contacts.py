@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import itertools
+import logging
+from typing import TYPE_CHECKING, Final, Iterable, Sequence
+
+from sqlalchemy import delete, insert, select
+
+from bot.db.models import ContactedUsername
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+CONTACTED_KEY_PREFIX: Final[str] = "wb:contacted"
+WARM_BATCH_SIZE: Final[int] = 10_000
+
+
+class ContactIndex:
+    """Usernames already handed to some account of a user.
+
+    contacted_usernames is the source of truth; a Redis set per user mirrors
+    it so that a chunk of an upload is checked with one SMISMEMBER. The set
+    is filled from the table on first use and marked ready; while Redis is
+    unavailable lookups go to the table. Writes join the caller's
+    transaction and reach Redis in `flush()`, after the commit."""
+
+    def __init__(self, redis: Redis | None, user_id: int) -> None:
+        self._redis = redis
+        self._user_id = user_id
+        self._key = f"{CONTACTED_KEY_PREFIX}:{user_id}"
+        self._ready_key = f"{self._key}:ready"
+        self._ready = False
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+
+    def _disable_redis(self, exc: Exception) -> None:
+        logger.warning(
+            "Redis недоступен для индекса контактов %s, читаем из БД: %s",
+            self._user_id,
+            exc,
+        )
+        self._redis = None
+
+    async def _warm(self, session: AsyncSession) -> bool:
+        if self._ready:
+            return True
+        try:
+            if not await self._redis.exists(self._ready_key):
+                # writers add to the set meanwhile, SADD makes the overlap harmless
+                result = await session.stream_scalars(
+                    select(ContactedUsername.username_key)
+                    .where(ContactedUsername.user_id == self._user_id)
+                    .execution_options(yield_per=WARM_BATCH_SIZE)
+                )
+                async for keys in result.partitions():
+                    await self._redis.sadd(self._key, *keys)
+                await self._redis.set(self._ready_key, 1)
+                logger.info("Индекс контактов %s загружен в Redis", self._user_id)
+        except Exception as exc:
+            self._disable_redis(exc)
+            return False
+        self._ready = True
+        return True
+
+    async def known(self, session: AsyncSession, keys: Sequence[str]) -> set[str]:
+        """Which of `keys` were already handed to an account of the user."""
+        if not keys:
+            return set()
+        if self._redis is not None and await self._warm(session):
+            try:
+                flags = await self._redis.smismember(self._key, list(keys))
+                return {key for key, flag in zip(keys, flags) if flag}
+            except Exception as exc:
+                self._disable_redis(exc)
+        return set(
+            await session.scalars(
+                select(ContactedUsername.username_key).where(
+                    ContactedUsername.user_id == self._user_id,
+                    ContactedUsername.username_key.in_(list(keys)),
+                )
+            )
+        )
+
+    async def add(self, session: AsyncSession, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        await session.execute(
+            insert(ContactedUsername.__table__)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite"),
+            [{"user_id": self._user_id, "username_key": key} for key in keys],
+        )
+        self._added.update(keys)
+        self._removed.difference_update(keys)
+
+    async def discard(self, session: AsyncSession, keys: Iterable[str]) -> None:
+        for chunk in itertools.batched(keys, WARM_BATCH_SIZE):
+            await session.execute(
+                delete(ContactedUsername).where(
+                    ContactedUsername.user_id == self._user_id,
+                    ContactedUsername.username_key.in_(chunk),
+                )
+            )
+            self._removed.update(chunk)
+            self._added.difference_update(chunk)
+
+    async def flush(self) -> None:
+        """Mirrors committed writes into Redis; if that fails the set is
+        marked stale and refilled from the table on next use."""
+        added, removed = self._added, self._removed
+        self._added, self._removed = set(), set()
+        if self._redis is None or not (added or removed):
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                if added:
+                    pipe.sadd(self._key, *added)
+                if removed:
+                    pipe.srem(self._key, *removed)
+                await pipe.execute()
+        except Exception as exc:
+            logger.warning("Не удалось обновить индекс контактов: %s", exc)
+            try:
+                await self._redis.delete(self._key, self._ready_key)
+            except Exception:
+                pass
+            self._redis = None
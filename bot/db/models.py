@@ -1,10 +1,16 @@
+import datetime
+import enum
+
 from sqlalchemy import (
     BLOB,
     BigInteger,
+    DateTime,
+    Index,
+    SmallInteger,
     String,
     Text,
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from sqlalchemy.orm.properties import ForeignKey
 
 from .base import Base
@@ -26,6 +32,10 @@ class UserDB(Base):
         back_populates="user",
         cascade="all, delete-orphan",
     )
+    contacted_usernames: Mapped[list["ContactedUsername"]] = relationship(
+        back_populates="user",
+        passive_deletes=True,
+    )
 
 
 class AccountFolder(Base):
@@ -69,6 +79,16 @@ class Account(Base):
         cascade="all, delete-orphan",
         uselist=False,
     )
+    username_counter: Mapped["UsernameCounter | None"] = relationship(
+        back_populates="account",
+        cascade="all, delete-orphan",
+        uselist=False,
+    )
+    archived_usernames: Mapped[list["UsernameArchive"]] = relationship(
+        back_populates="account",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 class AccountTexts(Base):
@@ -197,21 +217,140 @@ class ClosingText(AccountTextItemBase):
 
 class Username(Base):
     __tablename__ = "usernames"
+    __table_args__ = (
+        Index("uq_usernames_account_key", "account_id", "username_key", unique=True),
+        # queue reads: pending / sent rows of an account in id order
+        Index("ix_usernames_account_sended_id", "account_id", "sended", "id"),
+        # history pages walk an account's rows by id in both directions
+        Index("ix_usernames_account_id", "account_id", "id"),
+        # archival picks old sent rows
+        Index("ix_usernames_sended_at", "sended", "sended_at"),
+    )
 
     account: Mapped["Account"] = relationship(back_populates="usernames")
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"))
 
     username: Mapped[str] = mapped_column(String(100))
+    # usernames are case-insensitive in Telegram, duplicates are found by this
+    username_key: Mapped[str] = mapped_column(String(100))
     item_name: Mapped[str] = mapped_column(String(100))
     sended: Mapped[bool] = mapped_column(default=False)
+    sended_at: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime, nullable=True
+    )
+
+    @validates("username")
+    def _set_username_key(self, key: str, value: str) -> str:
+        self.username_key = value.lower()
+        return value
+
+
+class UsernameArchive(Base):
+    """Sent usernames moved out of the hot queue table; rows keep their
+    original id so history pages can walk both tables by id."""
+
+    __tablename__ = "usernames_archive"
+    __table_args__ = (
+        Index(
+            "uq_usernames_archive_account_key",
+            "account_id",
+            "username_key",
+            unique=True,
+        ),
+        Index("ix_usernames_archive_account_id", "account_id", "id"),
+    )
+
+    account: Mapped["Account"] = relationship(back_populates="archived_usernames")
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("accounts.id", ondelete="CASCADE")
+    )
+
+    username: Mapped[str] = mapped_column(String(100))
+    username_key: Mapped[str] = mapped_column(String(100))
+    item_name: Mapped[str] = mapped_column(String(100))
+    sended_at: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime, nullable=True
+    )
+
+
+class UsernameCounter(Base):
+    """Queue sizes of an account, kept in step with usernames by
+    bot.db.usernames and repaired by a periodic reconciliation."""
+
+    __tablename__ = "username_counters"
+
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("accounts.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    account: Mapped["Account"] = relationship(back_populates="username_counter")
+
+    pending: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    sent: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+
+    @property
+    def total(self) -> int:
+        return self.pending + self.sent
+
+
+class ContactedUsername(Base):
+    """Usernames handed to any account of a user, so that another account
+    of the same user doesn't write to them again; Redis keeps a set copy
+    for batch lookups (bot.contacts)."""
+
+    __tablename__ = "contacted_usernames"
+    __table_args__ = (
+        Index(
+            "uq_contacted_usernames_user_key", "user_id", "username_key", unique=True
+        ),
+    )
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    user: Mapped["UserDB"] = relationship(back_populates="contacted_usernames")
+    username_key: Mapped[str] = mapped_column(String(100))
+
+
+class JobStatus(enum.IntEnum):
+    PENDING = 0
+    ANSWERED = 1
+    # delivery failed; retried at next_attempt_at, parked when that is NULL
+    DEAD = 2
 
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_id", "status", "id"),)
 
     account: Mapped["Account"] = relationship(back_populates="jobs")
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"))
 
     name: Mapped[str] = mapped_column(String(50))
-    mdata: Mapped[int] = mapped_column(BLOB, nullable=True)  # metadata
-    answer: Mapped[int] = mapped_column(BLOB, nullable=True)
+    # msgpack, see bot.db.schemas for the layout of each job kind
+    mdata: Mapped[bytes | None] = mapped_column(BLOB, nullable=True)
+    answer: Mapped[bytes | None] = mapped_column(BLOB, nullable=True)
+    status: Mapped[int] = mapped_column(
+        SmallInteger,
+        nullable=False,
+        default=JobStatus.PENDING,
+        server_default="0",
+    )
+    # delivery lease taken by a manager replica, see send_job_answers
+    claimed_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    claimed_until: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime, nullable=True
+    )
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    next_attempt_at: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime, nullable=True
+    )
+
+    @validates("answer")
+    def _mark_answered(self, key: str, value: bytes | None) -> bytes | None:
+        # keeps the indexed status in sync for every writer of Job.answer
+        if value is not None:
+            self.status = JobStatus.ANSWERED
+        return value
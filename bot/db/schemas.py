@@ -0,0 +1,147 @@
+"""msgpack schemas of Job.mdata and Job.answer per job kind.
+
+Shared with the userbot through `make sync_models`: the userbot encodes
+answers with `encode_answer()`, the manager decodes them with the registered
+types. Kinds without a schema fall back to plain msgpack.
+
+Encoded blobs may be wrapped into a compression envelope:
+
+    0xC1 | codec (1 byte) | raw size (4 bytes, big endian) | body
+
+0xC1 is never used by msgpack, so blobs written before the envelope are
+told apart by their first byte and read as they are.
+"""
+
+import lzma
+import struct
+import zlib
+from typing import Any, Final
+
+import msgspec
+
+JOB_GET_NAMES: Final[str] = "get_names_and_usernames"
+
+ENVELOPE_MAGIC: Final[int] = 0xC1
+CODEC_RAW: Final[int] = 0
+CODEC_ZLIB: Final[int] = 1
+CODEC_LZMA: Final[int] = 2
+# below ZLIB_MIN the header costs more than it saves, above LZMA_MIN the
+# slower codec pays off on long name lists
+ZLIB_MIN: Final[int] = 512
+LZMA_MIN: Final[int] = 256 * 1024
+
+_header = struct.Struct(">BBI")
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+class NameEntry(msgspec.Struct, omit_defaults=True):
+    name: str | None = None
+    username: str | None = None
+
+
+class JobSchema(msgspec.Struct, frozen=True):
+    # type of one element of the answer list
+    answer_item: Any = None
+    mdata: Any = None
+
+
+JOB_SCHEMAS: Final[dict[str, JobSchema]] = {
+    JOB_GET_NAMES: JobSchema(answer_item=NameEntry),
+}
+
+_encoder = msgspec.msgpack.Encoder()
+_decoders: dict[Any, msgspec.msgpack.Decoder] = {}
+
+
+def decoder(type_: Any) -> msgspec.msgpack.Decoder:
+    if type_ not in _decoders:
+        _decoders[type_] = msgspec.msgpack.Decoder(type_)
+    return _decoders[type_]
+
+
+def encode(value: Any) -> bytes:
+    return _encoder.encode(value)
+
+
+def wrap(body: bytes) -> bytes:
+    if len(body) < ZLIB_MIN:
+        return body
+    if len(body) < LZMA_MIN:
+        codec, packed = CODEC_ZLIB, zlib.compress(body, 6)
+    else:
+        codec, packed = CODEC_LZMA, lzma.compress(body, preset=6)
+    if len(packed) + _header.size >= len(body):
+        return body
+    return _header.pack(ENVELOPE_MAGIC, codec, len(body)) + packed
+
+
+def is_wrapped(data: bytes) -> bool:
+    return len(data) >= _header.size and data[0] == ENVELOPE_MAGIC
+
+
+def payload_size(data: bytes) -> int:
+    """Size of the msgpack body without decompressing it."""
+    if is_wrapped(data):
+        return _header.unpack_from(data)[2]
+    return len(data)
+
+
+def unwrap(data: bytes, max_size: int | None = None) -> bytes:
+    if not is_wrapped(data):
+        return data
+    _, codec, size = _header.unpack_from(data)
+    if max_size is not None and size > max_size:
+        raise PayloadTooLarge(f"{size} bytes")
+    body = memoryview(data)[_header.size :]
+    # the size in the header is trusted only as an upper bound
+    limit = size + 1
+    if codec == CODEC_RAW:
+        return bytes(body)
+    if codec == CODEC_ZLIB:
+        decompressor: Any = zlib.decompressobj()
+    elif codec == CODEC_LZMA:
+        decompressor = lzma.LZMADecompressor()
+    else:
+        raise ValueError(f"unknown codec {codec}")
+    try:
+        raw = decompressor.decompress(body, limit)
+    except (zlib.error, lzma.LZMAError) as exc:
+        raise ValueError(f"corrupted payload: {exc}") from exc
+    if not decompressor.eof:
+        raise ValueError("truncated payload")
+    if len(raw) != size:
+        raise ValueError(f"payload size mismatch: {len(raw)} != {size}")
+    return raw
+
+
+def answer_item_type(job_name: str) -> Any:
+    schema = JOB_SCHEMAS.get(job_name)
+    return schema.answer_item if schema else None
+
+
+def encode_answer(job_name: str, items: list[Any]) -> bytes:
+    item_type = answer_item_type(job_name)
+    if item_type is not None:
+        # validates dicts coming from old userbot code paths as well
+        items = msgspec.convert(items, list[item_type])
+    return wrap(encode(items))
+
+
+def decode_mdata(job_name: str, data: bytes | None) -> Any:
+    if data is None:
+        return None
+    data = unwrap(data)
+    schema = JOB_SCHEMAS.get(job_name)
+    if schema is None or schema.mdata is None:
+        return msgspec.msgpack.decode(data)
+    return decoder(schema.mdata).decode(data)
+
+
+def encode_mdata(job_name: str, value: Any) -> bytes:
+    schema = JOB_SCHEMAS.get(job_name)
+    if schema is not None and schema.mdata is not None:
+        value = msgspec.convert(value, schema.mdata)
+    return wrap(encode(value))
@@ -0,0 +1,409 @@
+"""Queries over the usernames queue.
+
+Shared with the userbot through `make sync_models`; reads go through the
+(account_id, sended, id) index. Every write also moves the account's
+UsernameCounter in the same transaction, so sizes are read in O(1).
+
+Old sent rows live in usernames_archive; history and duplicate checks
+look at both tables, the queue itself only at the hot one.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import itertools
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, Sequence
+
+from sqlalchemy import (
+    Row,
+    and_,
+    delete,
+    false,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import Account, Username, UsernameArchive, UsernameCounter
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.contacts import ContactIndex
+    from bot.utils.func import UserData
+
+ProgressCallback = Callable[["InsertStats"], Awaitable[None]]
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+@dataclasses.dataclass
+class InsertStats:
+    new: int = 0
+    duplicates: int = 0  # repeated inside the uploaded list
+    known: int = 0  # already queued or sent for the account
+    contacted: int = 0  # already handed to another account of the user
+
+    @property
+    def total(self) -> int:
+        return self.new + self.duplicates + self.known + self.contacted
+
+
+async def insert_usernames(
+    session: AsyncSession,
+    account_id: int,
+    users: Iterable[UserData],
+    chunk_size: int,
+    on_progress: ProgressCallback | None = None,
+    contacts: ContactIndex | None = None,
+) -> InsertStats:
+    """Queues usernames with one Core executemany per chunk, which the
+    drivers send as a single multi-row INSERT, bypassing the unit of work;
+    every chunk is committed so memory stays bounded.
+
+    Rows hitting the unique (account_id, username_key) index are skipped by
+    INSERT IGNORE / INSERT OR IGNORE and counted from the rowcount; archived
+    usernames, and with `contacts` the ones another account of the user
+    already has, are looked up per chunk and skipped before the insert."""
+    stmt = (
+        insert(Username.__table__)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    stats = InsertStats()
+    seen: set[str] = set()
+    for chunk in itertools.batched(users, chunk_size):
+        rows = []
+        for user in chunk:
+            key = user.username.lower()
+            if key in seen:
+                stats.duplicates += 1
+                continue
+            seen.add(key)
+            rows.append(
+                {
+                    "account_id": account_id,
+                    "username": user.username,
+                    "username_key": key,
+                    "item_name": user.item_name,
+                    "sended": False,
+                }
+            )
+        if rows and contacts is not None:
+            taken = await contacts.known(session, [row["username_key"] for row in rows])
+            if taken:
+                # the index covers this account too, its own names stay known
+                own = await held_keys(session, [account_id], taken)
+                stats.known += len(own)
+                stats.contacted += len(taken) - len(own)
+                rows = [row for row in rows if row["username_key"] not in taken]
+        if rows:
+            archived = set(
+                await session.scalars(
+                    select(UsernameArchive.username_key).where(
+                        UsernameArchive.account_id == account_id,
+                        UsernameArchive.username_key.in_(
+                            [row["username_key"] for row in rows]
+                        ),
+                    )
+                )
+            )
+            if archived:
+                stats.known += len(archived)
+                rows = [row for row in rows if row["username_key"] not in archived]
+        if rows:
+            result = await session.execute(stmt, rows)
+            await bump_counter(session, account_id, pending=result.rowcount)
+            if contacts is not None:
+                await contacts.add(session, [row["username_key"] for row in rows])
+            await session.commit()
+            if contacts is not None:
+                await contacts.flush()
+            stats.new += result.rowcount
+            stats.known += len(rows) - result.rowcount
+        if on_progress is not None:
+            await on_progress(stats)
+    return stats
+
+
+async def held_keys(
+    session: AsyncSession, account_ids: Sequence[int], keys: Iterable[str]
+) -> set[str]:
+    """Which of `keys` the accounts have queued, sent or archived."""
+    keys = list(keys)
+    if not keys or not account_ids:
+        return set()
+    stmt = union_all(
+        *(
+            select(table.username_key).where(
+                table.account_id.in_(account_ids), table.username_key.in_(keys)
+            )
+            for table in (Username, UsernameArchive)
+        )
+    )
+    return set(await session.scalars(stmt))
+
+
+async def next_pending(
+    session: AsyncSession, account_id: int, n: int
+) -> Sequence[Username]:
+    return (
+        await session.scalars(
+            select(Username)
+            .where(Username.account_id == account_id, Username.sended == false())
+            .order_by(Username.id)
+            .limit(n)
+        )
+    ).all()
+
+
+def _history_branch(
+    table: type[Username] | type[UsernameArchive],
+    account_id: int,
+    limit: int,
+    before: int | None,
+    after: int | None,
+    ascending: bool,
+):
+    sended = table.sended if table is Username else literal(True)
+    stmt = select(
+        table.id, table.username, table.item_name, sended.label("sended")
+    ).where(table.account_id == account_id)
+    if before is not None:
+        stmt = stmt.where(table.id < before)
+    if after is not None:
+        stmt = stmt.where(table.id > after)
+    stmt = stmt.order_by(table.id.asc() if ascending else table.id.desc())
+    # each side stops at `limit` on its own (account_id, id) index
+    return select(stmt.limit(limit).subquery())
+
+
+async def history_page(
+    session: AsyncSession,
+    account_id: int,
+    limit: int,
+    *,
+    before: int | None = None,
+    after: int | None = None,
+    from_oldest: bool = False,
+) -> list[Row]:
+    """Keyset page over the queue and its archive, newest first: rows
+    older than `before`, newer than `after`, or the oldest ones. Rows have
+    id, username, item_name and sended."""
+    ascending = after is not None or from_oldest
+    branches = [
+        _history_branch(table, account_id, limit, before, after, ascending)
+        for table in (Username, UsernameArchive)
+    ]
+    union = union_all(*branches).subquery()
+    stmt = (
+        select(union)
+        .order_by(union.c.id.asc() if ascending else union.c.id.desc())
+        .limit(limit)
+    )
+    rows = list((await session.execute(stmt)).all())
+    if ascending:
+        rows.reverse()
+    return rows
+
+
+async def mark_sent(session: AsyncSession, account_id: int, ids: Iterable[int]) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+    result = await session.execute(
+        update(Username)
+        .where(
+            Username.account_id == account_id,
+            Username.id.in_(ids),
+            Username.sended == false(),
+        )
+        .values(sended=True, sended_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        await bump_counter(
+            session, account_id, pending=-result.rowcount, sent=result.rowcount
+        )
+    return result.rowcount
+
+
+async def reset_pending(
+    session: AsyncSession, account_id: int, contacts: ContactIndex | None = None
+) -> int:
+    """Drops the account's unsent usernames; with `contacts` they are freed
+    for other accounts too, call `contacts.flush()` after the commit."""
+    if contacts is not None:
+        keys = await session.scalars(
+            select(Username.username_key).where(
+                Username.account_id == account_id, Username.sended == false()
+            )
+        )
+        await contacts.discard(session, keys.all())
+    result = await session.execute(
+        delete(Username).where(
+            Username.account_id == account_id, Username.sended == false()
+        )
+    )
+    if result.rowcount:
+        await bump_counter(session, account_id, pending=-result.rowcount)
+    return result.rowcount
+
+
+async def bump_counter(
+    session: AsyncSession, account_id: int, pending: int = 0, sent: int = 0
+) -> None:
+    """Adds to the account's counters, creating the row on first use."""
+    dialect = session.get_bind().dialect.name
+    values = {"account_id": account_id, "pending": pending, "sent": sent}
+    changes = {
+        "pending": UsernameCounter.pending + pending,
+        "sent": UsernameCounter.sent + sent,
+    }
+    if dialect == "mysql":
+        stmt = mysql_insert(UsernameCounter).values(values)
+        stmt = stmt.on_duplicate_key_update(**changes)
+    else:
+        insert_ = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert_(UsernameCounter).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=["account_id"], set_=changes)
+    await session.execute(stmt)
+
+
+async def get_counters(
+    session: AsyncSession, account_ids: Iterable[int]
+) -> dict[int, UsernameCounter]:
+    counters = await session.scalars(
+        select(UsernameCounter)
+        .where(UsernameCounter.account_id.in_(list(account_ids)))
+        .execution_options(populate_existing=True)
+    )
+    return {counter.account_id: counter for counter in counters}
+
+
+async def get_counter(session: AsyncSession, account_id: int) -> UsernameCounter:
+    counter = (await get_counters(session, [account_id])).get(account_id)
+    return counter or UsernameCounter(account_id=account_id, pending=0, sent=0)
+
+
+async def reconcile_counters(session: AsyncSession) -> int:
+    """Recounts every account from usernames and rewrites the counters that
+    drifted; returns how many were fixed.
+
+    The counter row is locked before counting, so writers bumping it in
+    the meantime wait and apply their delta on top of the fresh value."""
+    fixed = 0
+    for account_id in (await session.scalars(select(Account.id))).all():
+        await bump_counter(session, account_id)
+        counter = await session.scalar(
+            select(UsernameCounter)
+            .where(UsernameCounter.account_id == account_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        counts = dict(
+            (
+                await session.execute(
+                    select(Username.sended, func.count())
+                    .where(Username.account_id == account_id)
+                    .group_by(Username.sended)
+                )
+            ).all()
+        )
+        archived = await session.scalar(
+            select(func.count()).where(UsernameArchive.account_id == account_id)
+        )
+        pending, sent = counts.get(False, 0), counts.get(True, 0) + archived
+        if counter is not None and (counter.pending, counter.sent) != (pending, sent):
+            counter.pending, counter.sent = pending, sent
+            fixed += 1
+        await session.commit()
+    return fixed
+
+
+async def stamp_sent(session: AsyncSession) -> int:
+    """Gives sent rows without sended_at the current time, so rows marked
+    sent outside mark_sent start aging from when they are first seen."""
+    result = await session.execute(
+        update(Username)
+        .where(Username.sended == true(), Username.sended_at.is_(None))
+        .values(sended_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def archive_sent(
+    session: AsyncSession, older_than: datetime.datetime, batch_size: int
+) -> int:
+    """Moves one batch of rows sent before `older_than` into the archive and
+    returns how many landed there; only those are deleted from usernames.
+    Counters are left alone, archived rows still count as sent."""
+    in_archive = (
+        select(UsernameArchive.id)
+        .where(
+            UsernameArchive.account_id == Username.account_id,
+            UsernameArchive.username_key == Username.username_key,
+        )
+        .exists()
+    )
+    ids = (
+        await session.scalars(
+            select(Username.id)
+            .where(
+                Username.sended == true(),
+                Username.sended_at < older_than,
+                # a key already archived under another id would never land
+                ~in_archive,
+            )
+            .order_by(Username.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+    ).all()
+    if not ids:
+        await session.commit()
+        return 0
+    columns = ("id", "account_id", "username", "username_key", "item_name", "sended_at")
+    await session.execute(
+        insert(UsernameArchive.__table__)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .from_select(
+            columns,
+            select(*(getattr(Username, name) for name in columns)).where(
+                Username.id.in_(ids)
+            ),
+        )
+    )
+    same_row = and_(
+        Username.id == UsernameArchive.id,
+        Username.account_id == UsernameArchive.account_id,
+        Username.username_key == UsernameArchive.username_key,
+    )
+    landed = (
+        await session.scalars(
+            select(UsernameArchive.id)
+            .join(Username, same_row)
+            .where(UsernameArchive.id.in_(ids))
+        )
+    ).all()
+    if landed:
+        await session.execute(
+            delete(Username)
+            .where(Username.id.in_(landed))
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+    return len(landed)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, TypeVar
+
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+    from aiogram.types import InputFile
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # the lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _ChatSlot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class DeliveryEngine:
+    """Sends Bot API calls with bounded concurrency, a global token bucket
+    and per-chat pacing; a flood wait pauses only its chat, which then
+    retries the call while other chats keep going."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        concurrency: int = 8,
+        rate: float = 25.0,
+        chat_interval: float = 1.0,
+        max_attempts: int = 5,
+    ) -> None:
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate)
+        self._chats: dict[int, _ChatSlot] = {}
+        self._results: dict[int, _ChatSlot] = {}
+        self._next_at: dict[int, float] = {}
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, chat_id: int) -> AsyncIterator[None]:
+        """Holds the chat for a whole result, so the messages of two results
+        sent to one chat concurrently don't interleave."""
+        slot = self._results.setdefault(chat_id, _ChatSlot())
+        slot.users += 1
+        try:
+            async with slot.lock:
+                yield
+        finally:
+            slot.users -= 1
+            if not slot.users:
+                self._results.pop(chat_id, None)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> Any:
+        return await self.call(
+            chat_id, lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        )
+
+    async def send_document(
+        self, chat_id: int, document: InputFile, **kwargs: Any
+    ) -> Any:
+        return await self.call(
+            chat_id,
+            lambda: self.bot.send_document(
+                chat_id=chat_id, document=document, **kwargs
+            ),
+        )
+
+    async def call(self, chat_id: int, method: Callable[[], Awaitable[T]]) -> T:
+        slot = self._chats.setdefault(chat_id, _ChatSlot())
+        slot.users += 1
+        try:
+            # one call per chat at a time keeps chunks of a result in order
+            async with slot.lock:
+                return await self._call_with_retries(chat_id, method)
+        finally:
+            slot.users -= 1
+            if not slot.users:
+                self._chats.pop(chat_id, None)
+
+    def _pace(self, chat_id: int, seconds: float) -> None:
+        now = time.monotonic()
+        if len(self._next_at) > 10_000:
+            self._next_at = {k: v for k, v in self._next_at.items() if v > now}
+        self._next_at[chat_id] = now + seconds
+
+    async def _call_with_retries(
+        self, chat_id: int, method: Callable[[], Awaitable[T]]
+    ) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = self._next_at.get(chat_id, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    result = await method()
+            except TelegramRetryAfter as exc:
+                if attempt >= self.max_attempts:
+                    raise
+                logger.warning(
+                    "Flood control в чате %s, ждем %s с", chat_id, exc.retry_after
+                )
+                self._pace(chat_id, exc.retry_after)
+                continue
+            except (TelegramNetworkError, TelegramServerError) as exc:
+                if attempt >= self.max_attempts:
+                    raise
+                backoff = min(30.0, 2.0**attempt)
+                logger.warning("Ошибка Bot API (%s), повтор через %s с", exc, backoff)
+                self._pace(chat_id, backoff)
+                continue
+            self._pace(chat_id, self.chat_interval)
+            return result
@@ -6,9 +6,9 @@ from typing import TYPE_CHECKING, Final
 from aiogram import F, Router
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import func, select
 
-from bot.db.models import Account, Username
+from bot.db.models import Account, UsernameCounter
+from bot.db.usernames import get_counter, history_page
 from bot.keyboards.factories import HistoryFactory
 from bot.keyboards.inline import ik_action_with_account
 from bot.states import AccountState
@@ -18,17 +18,22 @@ from .common import account_back_to, account_from_state, alert_notifier
 router = Router()
 logger = logging.getLogger(__name__)
 HISTORY_PAGE_SIZE: Final[int] = 10
+HISTORY_FIRST: Final[str] = "first"
+HISTORY_OLDER: Final[str] = "older"
+HISTORY_NEWER: Final[str] = "newer"
+HISTORY_LAST: Final[str] = "last"
 MAX_TG_MESSAGE_LENGTH: Final[int] = 4096
 
 if TYPE_CHECKING:
     from aiogram.fsm.context import FSMContext
     from aiogram.types import CallbackQuery
+    from sqlalchemy import Row
     from sqlalchemy.ext.asyncio import AsyncSession
 
     from bot.db.models import UserDB
 
 
-def _format_username_item(username: Username) -> str:
+def _format_username_item(username: Row) -> str:
     mention = username.username
     if mention and not mention.startswith("@"):
         mention = f"@{mention}"
@@ -40,15 +45,16 @@ def _format_username_item(username: Username) -> str:
 
 def _history_text(
     account: Account,
-    usernames: list[Username],
+    usernames: list[Row],
     page: int,
     total_pages: int,
-    total: int,
+    counter: UsernameCounter,
 ) -> str:
     header = account.name or account.phone
     rows = [
         f"История отправок для {header}",
-        f"Всего получателей: {total}",
+        f"Всего получателей: {counter.total}",
+        f"Отправлено: {counter.sent}, в очереди: {counter.pending}",
         f"Страница {page}/{total_pages}",
         "",
     ]
@@ -65,21 +71,40 @@ def _history_text(
     return text
 
 
-def _history_keyboard(page: int, total_pages: int) -> InlineKeyboardMarkup:
+def _history_keyboard(
+    usernames: list[Row],
+    page: int,
+    total_pages: int,
+    has_newer: bool,
+    has_older: bool,
+) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    adjust = []
-    if total_pages > 1 and page > 1:
-        builder.button(text="⬅️", callback_data=HistoryFactory(page=page - 1))
-        adjust.append(1)
-    if total_pages > 1 and page < total_pages:
-        builder.button(text="➡️", callback_data=HistoryFactory(page=page + 1))
-        if adjust:
-            adjust[0] += 1
-        else:
-            adjust.append(1)
+    nav = 0
+    if has_newer and usernames:
+        builder.button(
+            text="⏮", callback_data=HistoryFactory(page=1, direction=HISTORY_FIRST)
+        )
+        builder.button(
+            text="⬅️",
+            callback_data=HistoryFactory(
+                page=page - 1, cursor=usernames[0].id, direction=HISTORY_NEWER
+            ),
+        )
+        nav += 2
+    if has_older and usernames:
+        builder.button(
+            text="➡️",
+            callback_data=HistoryFactory(
+                page=page + 1, cursor=usernames[-1].id, direction=HISTORY_OLDER
+            ),
+        )
+        builder.button(
+            text="⏭",
+            callback_data=HistoryFactory(page=total_pages, direction=HISTORY_LAST),
+        )
+        nav += 2
     builder.button(text="🔙 К действиям", callback_data="history_back")
-    adjust.append(1)
-    builder.adjust(*adjust)
+    builder.adjust(*((nav, 1) if nav else (1,)))
     return builder.as_markup()
 
 
@@ -95,28 +120,48 @@ async def history_usernames(
     if not account:
         return
 
-    total_stmt = (
-        select(func.count())
-        .select_from(Username)
-        .where(Username.account_id == account.id)
-    )
-    total = (await session.execute(total_stmt)).scalar_one()
+    direction = callback_data.direction
+    counter = await get_counter(session, account.id)
+    total = counter.total
     total_pages = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
     page = max(1, min(callback_data.page, total_pages))
+    # one extra row tells whether there is a page further in that direction
+    probe = HISTORY_PAGE_SIZE + 1
+
+    usernames: list[Row] = []
+    if direction == HISTORY_OLDER:
+        usernames = await history_page(
+            session, account.id, probe, before=callback_data.cursor
+        )
+        has_newer, has_older = True, len(usernames) > HISTORY_PAGE_SIZE
+        usernames = usernames[:HISTORY_PAGE_SIZE]
+    elif direction == HISTORY_NEWER:
+        usernames = await history_page(
+            session, account.id, probe, after=callback_data.cursor
+        )
+        has_newer, has_older = len(usernames) > HISTORY_PAGE_SIZE, True
+        usernames = usernames[-HISTORY_PAGE_SIZE:]
+    elif direction == HISTORY_LAST:
+        on_last_page = total - (total_pages - 1) * HISTORY_PAGE_SIZE
+        usernames = await history_page(
+            session, account.id, max(on_last_page, 1), from_oldest=True
+        )
+        page = total_pages
+        has_newer, has_older = total_pages > 1, False
 
-    stmt = (
-        select(Username)
-        .where(Username.account_id == account.id)
-        .order_by(Username.id.desc())
-        .offset((page - 1) * HISTORY_PAGE_SIZE)
-        .limit(HISTORY_PAGE_SIZE)
-    )
-    usernames = (await session.execute(stmt)).scalars().all()
+    if not usernames:
+        # first page, or the cursor ran off rows deleted meanwhile
+        usernames = await history_page(session, account.id, probe)
+        page = 1
+        has_newer, has_older = False, len(usernames) > HISTORY_PAGE_SIZE
+        usernames = usernames[:HISTORY_PAGE_SIZE]
 
-    text = _history_text(account, usernames, page, total_pages, total)
+    text = _history_text(account, usernames, page, total_pages, counter)
     await query.message.edit_text(
         text=text,
-        reply_markup=_history_keyboard(page, total_pages),
+        reply_markup=_history_keyboard(
+            usernames, page, total_pages, has_newer, has_older
+        ),
     )
 
 
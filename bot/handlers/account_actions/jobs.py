@@ -6,6 +6,7 @@ from typing import TYPE_CHECKING
 from aiogram import F, Router
 
 from bot.db.models import Job
+from bot.db.schemas import JOB_GET_NAMES
 from bot.keyboards.inline import ik_action_with_account
 from bot.states import AccountState
 
@@ -14,8 +15,6 @@ from .common import account_back_to, account_from_state, alert_notifier
 router = Router()
 logger = logging.getLogger(__name__)
 
-JOB_GET_NAMES = "get_names_and_usernames"
-
 if TYPE_CHECKING:
     from aiogram.fsm.context import FSMContext
     from aiogram.types import CallbackQuery
@@ -1,27 +1,44 @@
 from __future__ import annotations
 
 import logging
+import os
+import tempfile
+import time
 from functools import partial
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Final
 
 from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message
-from sqlalchemy import and_, delete
 
-from bot.db.models import Username
+from bot.contacts import ContactIndex
+from bot.db.usernames import (
+    InsertStats,
+    ProgressCallback,
+    insert_usernames,
+    reset_pending,
+)
 from bot.keyboards.factories import CancelFactory
 from bot.keyboards.inline import ik_action_with_account, ik_cancel_action
+from bot.settings import se
 from bot.states import AccountState
 from bot.utils import fn
+from bot.utils.func import RejectedLines
 
 from .common import account_back_to, account_from_state, alert_notifier
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+PROGRESS_EDIT_SECONDS: Final[float] = 2.0
+NICKS_FILE_SUFFIXES: Final[frozenset[str]] = frozenset((".txt", ".csv"))
+# bots can download files up to 20 MB through the Bot API
+MAX_NICKS_FILE_BYTES: Final[int] = 20 * 1024 * 1024
+
 if TYPE_CHECKING:
     from aiogram.fsm.context import FSMContext
     from aiogram.types import CallbackQuery
+    from redis.asyncio import Redis
     from sqlalchemy.ext.asyncio import AsyncSession
 
     from bot.db.models import UserDB
@@ -39,7 +56,7 @@ async def load_nicks_account(
         return
 
     await query.message.edit_text(
-        text="Отправьте никнеймы",
+        text="Отправьте никнеймы текстом или файлом .txt / .csv",
         reply_markup=await ik_cancel_action(back_to="cancel_load_nicks"),
     )
     await state.set_state(AccountState.load_nicks)
@@ -61,12 +78,117 @@ async def cancel_load_nicks(
     await state.set_state(AccountState.actions)
 
 
+def _progress_editor(message: Message, total: int | None = None) -> ProgressCallback:
+    last_edit = time.monotonic()
+
+    async def on_progress(stats: InsertStats) -> None:
+        nonlocal last_edit
+        # edits are throttled, Telegram rate limits them per chat
+        done = stats.total
+        finished = total is not None and done >= total
+        if not finished and time.monotonic() - last_edit < PROGRESS_EDIT_SECONDS:
+            return
+        last_edit = time.monotonic()
+        text = f"Обработано {done} из {total}" if total else f"Обработано {done}"
+        try:
+            await message.edit_text(text=text)
+        except TelegramBadRequest as exc:
+            logger.debug("Не удалось обновить прогресс загрузки: %s", exc)
+
+    return on_progress
+
+
+def _stats_text(stats: InsertStats) -> str:
+    text = (
+        f"{stats.new} ч. успешно добавлены в очередь\n"
+        f"Повторы в списке: {stats.duplicates}\n"
+        f"Уже были в очереди или отправлены: {stats.known}"
+    )
+    if stats.contacted:
+        text += f"\nУже есть у других ваших аккаунтов: {stats.contacted}"
+    return text
+
+
+def _rejected_text(rejected: RejectedLines) -> str:
+    more = rejected.count - len(rejected.sample)
+    text = f"Не были распознаны эти строки:\n\n{'\n'.join(rejected.sample)}"
+    if more:
+        text += f"\n\n... и еще {more}"
+    return text[: fn.max_length_message]
+
+
+async def _finish_load_nicks(
+    message: Message,
+    state: FSMContext,
+    stats: InsertStats,
+    rejected: RejectedLines,
+) -> None:
+    await message.answer(text=_stats_text(stats))
+    if rejected.count:
+        await message.answer(text=_rejected_text(rejected))
+    await state.set_state(AccountState.actions)
+    await message.answer(
+        text="Действия с аккаунтом",
+        reply_markup=await ik_action_with_account(back_to=await account_back_to(state)),
+    )
+
+
+@router.message(AccountState.load_nicks, F.document)
+async def catch_load_nicks_file(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB,
+    redis: Redis,
+) -> None:
+    account = await account_from_state(
+        state,
+        session,
+        partial(message.answer),
+        user,
+    )
+    if not account:
+        return
+
+    document = message.document
+    suffix = os.path.splitext(document.file_name or "")[1].lower()
+    if suffix not in NICKS_FILE_SUFFIXES:
+        await message.answer(text="Поддерживаются только файлы .txt и .csv")
+        return
+    if document.file_size and document.file_size > MAX_NICKS_FILE_BYTES:
+        await message.answer(text="Файл больше 20 МБ, разбейте его на части")
+        return
+
+    fd, path = tempfile.mkstemp(prefix="nicks_", suffix=suffix)
+    os.close(fd)
+    rejected = RejectedLines()
+    try:
+        await message.bot.download(document, destination=path)
+        progress = await message.answer(text="Обработано 0")
+        stats = await insert_usernames(
+            session,
+            account.id,
+            fn.iter_users_from_file(path, rejected, is_csv=suffix == ".csv"),
+            chunk_size=se.usernames_insert_chunk_size,
+            on_progress=_progress_editor(progress),
+            contacts=ContactIndex(redis, user.id),
+        )
+    finally:
+        os.unlink(path)
+
+    if not stats.total:
+        await message.answer(text="В файле не найдено никнеймов")
+        return
+    await _finish_load_nicks(message, state, stats, rejected)
+
+
 @router.message(AccountState.load_nicks)
 async def catch_load_nicks(
     message: Message,
     state: FSMContext,
     session: AsyncSession,
     user: UserDB,
+    redis: Redis,
 ) -> None:
     account = await account_from_state(
         state,
@@ -84,25 +206,20 @@ async def catch_load_nicks(
         await message.answer(text="Текст не корректный")
         return
 
-    for n in usernames:
-        session.add(
-            Username(
-                username=n.username,
-                item_name=n.item_name,
-                account_id=account.id,
-            )
-        )
-
-    await session.commit()
-    await message.answer(text=f"{len(usernames)} ч. успешно добавлены в очередь")
-    if line_not_handled:
-        await message.answer(
-            text=f"Не были распознаны эти строки:\n\n{'\n'.join(line_not_handled)}"
-        )
-    await state.set_state(AccountState.actions)
-    await message.answer(
-        text="Действия с аккаунтом",
-        reply_markup=await ik_action_with_account(back_to=await account_back_to(state)),
+    progress = await message.answer(text=f"Обработано 0 из {len(usernames)}")
+    stats = await insert_usernames(
+        session,
+        account.id,
+        usernames,
+        chunk_size=se.usernames_insert_chunk_size,
+        on_progress=_progress_editor(progress, len(usernames)),
+        contacts=ContactIndex(redis, user.id),
+    )
+    await _finish_load_nicks(
+        message,
+        state,
+        stats,
+        RejectedLines(count=len(line_not_handled), sample=line_not_handled),
     )
 
 
@@ -112,18 +229,14 @@ async def reset_nicks_account(
     state: FSMContext,
     session: AsyncSession,
     user: UserDB,
+    redis: Redis,
 ) -> None:
     account = await account_from_state(state, session, alert_notifier(query), user)
     if not account:
         return
 
-    await session.execute(
-        delete(Username).where(
-            and_(
-                Username.account_id == account.id,
-                Username.sended.is_(False),
-            )
-        )
-    )
+    contacts = ContactIndex(redis, user.id)
+    await reset_pending(session, account.id, contacts)
     await session.commit()
+    await contacts.flush()
     await query.answer(text="Очередь успешно отчищена!", show_alert=True)
@@ -7,6 +7,7 @@ from aiogram import F, Router
 from sqlalchemy import select
 
 from bot.db.models import Account, AccountFolder
+from bot.db.usernames import get_counters
 from bot.keyboards.factories import FolderDeleteFactory, FolderFactory
 from bot.keyboards.inline import (
     ik_available_accounts,
@@ -88,6 +89,8 @@ async def _show_accounts(
             list(accounts),
             back_to=LIST_BACK_TO,
             add_to_folder_id=add_to_folder_id,
+            counters=await get_counters(session, [a.id for a in accounts]),
+            load_nicks_folder_id=add_to_folder_id,
         ),
     )
 
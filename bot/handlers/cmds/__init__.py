@@ -1,8 +1,9 @@
 from aiogram import Router
 
-from . import create_deep_link, reg_account, start
+from . import create_deep_link, dead_letters, reg_account, start
 
 router = Router()
 router.include_router(start.router)
 router.include_router(reg_account.router)
 router.include_router(create_deep_link.router)
+router.include_router(dead_letters.router)
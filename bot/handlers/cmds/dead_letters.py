@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+from aiogram import Router
+from aiogram.filters.command import Command, CommandObject
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import load_only
+
+from bot.db.models import Account, Job, JobStatus
+
+if TYPE_CHECKING:
+    from aiogram.types import Message
+    from sqlalchemy import ColumnElement
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.db.models import UserDB
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+DEAD_JOBS_LIMIT = 30
+
+
+def _own_jobs(user: UserDB) -> ColumnElement[bool]:
+    return Job.account_id.in_(select(Account.id).where(Account.user_id == user.id))
+
+
+@router.message(Command(commands=["dead_jobs"]))
+async def dead_jobs(
+    message: Message, session: AsyncSession, user: UserDB | None
+) -> None:
+    if not user or not user.is_admin:
+        await message.answer("Вы не администратор")
+        return
+
+    where = (Job.status == JobStatus.DEAD, _own_jobs(user))
+    total = await session.scalar(select(func.count(Job.id)).where(*where))
+    if not total:
+        await message.answer("Недоставленных ответов нет")
+        return
+
+    rows = (
+        await session.execute(
+            select(Job, Account)
+            .join(Account, Job.account_id == Account.id)
+            # answer and mdata are blobs of up to JOB_ANSWERS_MAX_BYTES
+            .options(load_only(Job.name, Job.attempts, Job.next_attempt_at))
+            .where(*where)
+            .order_by(Job.id)
+            .limit(DEAD_JOBS_LIMIT)
+        )
+    ).all()
+    lines = [f"Недоставленных ответов: {total}"]
+    for job, account in rows:
+        retry = (
+            f"повтор {job.next_attempt_at:%d.%m %H:%M} UTC"
+            if job.next_attempt_at
+            else "попытки исчерпаны"
+        )
+        lines.append(
+            f"#{job.id} {job.name} ({account.name or account.phone}), "
+            f"попыток: {job.attempts}, {retry}"
+        )
+    lines.append("\n/replay_jobs all или /replay_jobs <id> <id> ...")
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command(commands=["replay_jobs"]))
+async def replay_jobs(
+    message: Message,
+    command: CommandObject,
+    session: AsyncSession,
+    user: UserDB | None,
+) -> None:
+    if not user or not user.is_admin:
+        await message.answer("Вы не администратор")
+        return
+
+    args = command.args.split() if command.args else []
+    if not args:
+        await message.answer("Укажите id задач или all")
+        return
+
+    where = [Job.status == JobStatus.DEAD, _own_jobs(user)]
+    if args != ["all"]:
+        try:
+            ids = [int(arg.lstrip("#")) for arg in args]
+        except ValueError:
+            await message.answer("Id задач должны быть числами")
+            return
+        where.append(Job.id.in_(ids))
+
+    # back to the main sweep with a fresh attempt budget
+    result = await session.execute(
+        update(Job)
+        .where(*where)
+        .values(
+            status=JobStatus.ANSWERED,
+            attempts=0,
+            next_attempt_at=None,
+            claimed_by=None,
+            claimed_until=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    logger.info("Пользователь %s вернул в очередь %s ответов", user.id, result.rowcount)
+    await message.answer(f"Возвращено в очередь доставки: {result.rowcount}")
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import dataclasses
+import itertools
+import logging
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+from aiogram import F, Router
+from sqlalchemy import select
+
+from bot.contacts import ContactIndex
+from bot.db.models import Account, AccountFolder
+from bot.db.usernames import InsertStats, get_counters, held_keys, insert_usernames
+from bot.keyboards.factories import CancelFactory, FolderNicksFactory
+from bot.keyboards.inline import ik_cancel_action, ik_folder_list
+from bot.settings import se
+from bot.states import FolderState
+from bot.utils import fn
+from bot.utils.func import RejectedLines
+
+from .account_actions.usernames import (
+    MAX_NICKS_FILE_BYTES,
+    NICKS_FILE_SUFFIXES,
+    _progress_editor,
+    _rejected_text,
+    _stats_text,
+)
+from .accounts import _ensure_admin, show_folder_accounts_by_id
+
+if TYPE_CHECKING:
+    from aiogram.fsm.context import FSMContext
+    from aiogram.types import CallbackQuery, Message
+    from redis.asyncio import Redis
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot.db.models import UserDB
+    from bot.utils.func import UserData
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+@router.callback_query(FolderNicksFactory.filter())
+async def load_nicks_folder(
+    query: CallbackQuery,
+    callback_data: FolderNicksFactory,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB | None,
+) -> None:
+    if not await _ensure_admin(query, user):
+        return
+
+    folder = await session.scalar(
+        select(AccountFolder).where(
+            AccountFolder.id == callback_data.id,
+            AccountFolder.user_id == user.id,
+        )
+    )
+    if not folder:
+        await query.answer(text="Папка не найдена", show_alert=True)
+        return
+
+    await state.set_state(FolderState.load_nicks)
+    await state.update_data(folder_id=folder.id)
+    await query.message.edit_text(
+        text=(
+            f"Отправьте никнеймы для папки {folder.name} текстом или файлом"
+            " .txt / .csv\n\nСписок разделится между подключенными аккаунтами"
+            " папки по их пропускной"
+        ),
+        reply_markup=await ik_cancel_action(back_to="cancel_folder_nicks"),
+    )
+
+
+@router.callback_query(
+    FolderState.load_nicks,
+    CancelFactory.filter(F.to == "cancel_folder_nicks"),
+)
+async def cancel_load_nicks_folder(
+    query: CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB,
+) -> None:
+    folder_id = (await state.get_data()).get("folder_id")
+    await fn.state_clear(state)
+    await show_folder_accounts_by_id(query, session, state, user, folder_id=folder_id)
+
+
+async def _connected_accounts(
+    session: AsyncSession, user: UserDB, folder_id: int
+) -> list[Account]:
+    accounts = (
+        await session.scalars(
+            select(Account)
+            .where(Account.user_id == user.id, Account.folder_id == folder_id)
+            .order_by(Account.id)
+        )
+    ).all()
+    for account in accounts:
+        account.is_connected = await fn.Manager.bot_run(account.phone)
+    await session.commit()
+    return [account for account in accounts if account.is_connected]
+
+
+async def _distribute_nicks(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB,
+    redis: Redis,
+    users: list[UserData],
+    rejected: RejectedLines,
+) -> None:
+    folder_id = (await state.get_data()).get("folder_id")
+    accounts = await _connected_accounts(session, user, folder_id)
+    if not accounts:
+        await message.answer(text="В папке нет подключенных аккаунтов")
+        return
+
+    # duplicates are dropped before the split so they don't skew the shares
+    unique: dict[str, UserData] = {}
+    for user_data in users:
+        unique.setdefault(user_data.username.lower(), user_data)
+    stats = InsertStats(duplicates=len(users) - len(unique))
+    # names some account already has are dropped before the split as well;
+    # the ones held inside this folder count as known
+    contacts = ContactIndex(redis, user.id)
+    account_ids = [account.id for account in accounts]
+    for chunk in itertools.batched(list(unique), se.usernames_insert_chunk_size):
+        taken = await contacts.known(session, chunk)
+        if not taken:
+            continue
+        own = await held_keys(session, account_ids, taken)
+        stats.known += len(own)
+        stats.contacted += len(taken) - len(own)
+        for key in taken:
+            del unique[key]
+    shard_source = list(unique.values())
+    if not shard_source:
+        await message.answer(
+            text=f"Новых никнеймов для загрузки нет\n\n{_stats_text(stats)}"
+        )
+        if rejected.count:
+            await message.answer(text=_rejected_text(rejected))
+        return
+
+    counters = await get_counters(session, [a.id for a in accounts])
+    shares = fn.split_by_weight(
+        len(shard_source),
+        [account.batch_size for account in accounts],
+        [counters[a.id].pending if a.id in counters else 0 for a in accounts],
+    )
+
+    progress = await message.answer(text=f"Обработано 0 из {len(users)}")
+    editor = _progress_editor(progress, len(users))
+    lines = []
+    start = 0
+    for account, share in zip(accounts, shares):
+        if not share:
+            continue
+        done = dataclasses.replace(stats)
+
+        async def on_progress(part: InsertStats, done: InsertStats = done) -> None:
+            await editor(
+                InsertStats(
+                    done.new + part.new,
+                    done.duplicates + part.duplicates,
+                    done.known + part.known,
+                    done.contacted + part.contacted,
+                )
+            )
+
+        part = await insert_usernames(
+            session,
+            account.id,
+            shard_source[start : start + share],
+            chunk_size=se.usernames_insert_chunk_size,
+            on_progress=on_progress,
+            contacts=contacts,
+        )
+        start += share
+        stats.new += part.new
+        stats.known += part.known
+        stats.contacted += part.contacted
+        lines.append(f"{account.phone} ({account.name or '?'}): {part.new}")
+
+    logger.info(
+        "Ники папки %s распределены между %s аккаунтами: %s",
+        folder_id,
+        len(lines),
+        shares,
+    )
+    text = _stats_text(stats)
+    if lines:
+        text += "\n\nПо аккаунтам:\n" + "\n".join(lines)
+    await message.answer(text=text[: fn.max_length_message])
+    if rejected.count:
+        await message.answer(text=_rejected_text(rejected))
+
+    await fn.state_clear(state)
+    folders = (
+        await session.scalars(
+            select(AccountFolder)
+            .where(AccountFolder.user_id == user.id)
+            .order_by(AccountFolder.id)
+        )
+    ).all()
+    await message.answer(
+        text="Папки",
+        reply_markup=await ik_folder_list(list(folders)),
+    )
+
+
+@router.message(FolderState.load_nicks, F.document)
+async def catch_load_nicks_folder_file(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB | None,
+    redis: Redis,
+) -> None:
+    if not user or not user.is_admin:
+        return
+
+    document = message.document
+    suffix = os.path.splitext(document.file_name or "")[1].lower()
+    if suffix not in NICKS_FILE_SUFFIXES:
+        await message.answer(text="Поддерживаются только файлы .txt и .csv")
+        return
+    if document.file_size and document.file_size > MAX_NICKS_FILE_BYTES:
+        await message.answer(text="Файл больше 20 МБ, разбейте его на части")
+        return
+
+    fd, path = tempfile.mkstemp(prefix="nicks_", suffix=suffix)
+    os.close(fd)
+    rejected = RejectedLines()
+    try:
+        await message.bot.download(document, destination=path)
+        # the split needs the size of the whole list up front
+        users = list(fn.iter_users_from_file(path, rejected, is_csv=suffix == ".csv"))
+    finally:
+        os.unlink(path)
+
+    if not users:
+        await message.answer(text="В файле не найдено никнеймов")
+        return
+    await _distribute_nicks(message, state, session, user, redis, users, rejected)
+
+
+@router.message(FolderState.load_nicks)
+async def catch_load_nicks_folder(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    user: UserDB | None,
+    redis: Redis,
+) -> None:
+    if not user or not user.is_admin:
+        return
+
+    users, line_not_handled = await fn.parse_users_from_text(
+        message.text if message.text else ""
+    )
+    if not users:
+        await message.answer(text="Текст не корректный")
+        return
+    await _distribute_nicks(
+        message,
+        state,
+        session,
+        user,
+        redis,
+        users,
+        RejectedLines(count=len(line_not_handled), sample=line_not_handled),
+    )
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+from typing import TYPE_CHECKING, Final
+
+from redis.exceptions import ResponseError
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# shared with the userbot through `make sync_models`: the userbot calls
+# publish_job_answer() right after it stores Job.answer
+JOB_ANSWERS_STREAM: Final[str] = "wb:jobs:answers"
+JOB_ANSWERS_GROUP: Final[str] = "managerbot"
+JOB_ANSWERS_MAXLEN: Final[int] = 10_000
+
+
+def consumer_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_job_answer(redis: Redis, job_id: int) -> None:
+    await redis.xadd(
+        JOB_ANSWERS_STREAM,
+        {"job_id": job_id},
+        maxlen=JOB_ANSWERS_MAXLEN,
+        approximate=True,
+    )
+
+
+async def ensure_group(redis: Redis) -> None:
+    try:
+        await redis.xgroup_create(
+            JOB_ANSWERS_STREAM, JOB_ANSWERS_GROUP, id="$", mkstream=True
+        )
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+async def read_job_answers(
+    redis: Redis,
+    consumer: str,
+    block_ms: int,
+    count: int = 100,
+) -> list[tuple[bytes, int | None]]:
+    response = await redis.xreadgroup(
+        JOB_ANSWERS_GROUP,
+        consumer,
+        {JOB_ANSWERS_STREAM: ">"},
+        count=count,
+        block=block_ms,
+    )
+    events = []
+    for _, messages in response or ():
+        for message_id, fields in messages:
+            raw = fields.get(b"job_id", fields.get("job_id"))
+            try:
+                job_id = int(raw) if raw is not None else None
+            except ValueError:
+                logger.warning("Некорректное событие %s: %s", message_id, fields)
+                job_id = None
+            events.append((message_id, job_id))
+    return events
+
+
+async def ack_job_answers(redis: Redis, *message_ids: bytes) -> None:
+    if message_ids:
+        await redis.xack(JOB_ANSWERS_STREAM, JOB_ANSWERS_GROUP, *message_ids)
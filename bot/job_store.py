@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import socket
+import uuid
+from typing import TYPE_CHECKING
+
+from redis.exceptions import WatchError
+
+from bot.scheduler import JobStore
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+    from bot.scheduler import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _to_ms(moment: datetime.datetime) -> int:
+    return round(moment.timestamp() * 1000)
+
+
+def _from_ms(value: bytes | str | int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(int(value) / 1000)
+
+
+class RedisJobStore(JobStore):
+    """Keeps job definitions and next_run in Redis hashes.
+
+    A due fire is claimed by atomically moving the stored next_run from the
+    fire time to the following one (WATCH/MULTI), so when several replicas
+    share one Redis only the replica that wins the swap runs the job.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        prefix: str = "scheduler:jobs",
+        replica_id: str | None = None,
+    ) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.replica_id = (
+            replica_id
+            or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+
+    def _key(self, job: Job) -> str:
+        return f"{self.prefix}:{job.job_id}"
+
+    async def add_job(self, job: Job) -> None:
+        key = self._key(job)
+        await self.redis.hset(
+            key,
+            mapping={
+                "func": getattr(job.job_func, "__qualname__", repr(job.job_func)),
+                "interval": job.interval,
+                "latest": job.latest if job.latest is not None else "",
+                "unit": job.unit or "",
+                "tags": ",".join(sorted(map(str, job.tags))),
+            },
+        )
+        if not await self.redis.hsetnx(key, "next_run", _to_ms(job.next_run)):
+            await self.load(job)
+            logger.info("Restored %s, next run at %s", job.job_id, job.next_run)
+
+    async def remove_job(self, job: Job) -> None:
+        await self.redis.delete(self._key(job))
+
+    async def claim(
+        self, job: Job, fire_at: datetime.datetime, next_run: datetime.datetime
+    ) -> bool:
+        key = self._key(job)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                current = await pipe.hget(key, "next_run")
+                if current is None or int(current) != _to_ms(fire_at):
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.hset(
+                    key,
+                    mapping={
+                        "next_run": _to_ms(next_run),
+                        "owner": self.replica_id,
+                        "claimed_at": _to_ms(datetime.datetime.now()),
+                    },
+                )
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def load(self, job: Job) -> None:
+        stored = await self.redis.hget(self._key(job), "next_run")
+        if stored is None:
+            await self.save(job)
+            return
+        job._set_next_run(_from_ms(stored))
+
+    async def save(self, job: Job) -> None:
+        await self.redis.hset(self._key(job), "next_run", _to_ms(job.next_run))
@@ -15,6 +15,9 @@ class CancelFactory(CallbackData, prefix="cn"):
 
 class HistoryFactory(CallbackData, prefix="hst"):
     page: int
+    # keyset cursor: id of the first (newer) or last (older) row shown
+    cursor: int = 0
+    direction: str = "first"  # first / older / newer / last
 
 
 class BatchSizeFactory(CallbackData, prefix="bs"):
@@ -37,5 +40,9 @@ class FolderDeleteFactory(CallbackData, prefix="fdel"):
     id: int
 
 
+class FolderNicksFactory(CallbackData, prefix="fnk"):
+    id: int
+
+
 class AccountTextFactory(CallbackData, prefix="txt"):
     field: str
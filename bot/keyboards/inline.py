@@ -3,7 +3,7 @@ from typing import Final
 from aiogram.types import InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from bot.db.models import Account, AccountFolder
+from bot.db.models import Account, AccountFolder, UsernameCounter
 from bot.keyboards.factories import (
     AccountFactory,
     AccountTextFactory,
@@ -14,6 +14,7 @@ from bot.keyboards.factories import (
     FolderDeleteFactory,
     FolderFactory,
     FolderMoveFactory,
+    FolderNicksFactory,
     HistoryFactory,
 )
 
@@ -34,8 +35,11 @@ async def ik_available_accounts(
     back_to: str = "default",
     add_to_folder_id: int | None = None,
     delete_folder_id: int | None = None,
+    counters: dict[int, UsernameCounter] | None = None,
+    load_nicks_folder_id: int | None = None,
 ) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
+    counters = counters or {}
     if add_to_folder_id is not None:
         builder.button(
             text="➕ Добавить аккаунт",
@@ -46,9 +50,16 @@ async def ik_available_accounts(
             text="🗑 Удалить папку",
             callback_data=FolderDeleteFactory(id=delete_folder_id),
         )
+    if load_nicks_folder_id is not None:
+        builder.button(
+            text="🌀 Загрузить ники в папку",
+            callback_data=FolderNicksFactory(id=load_nicks_folder_id),
+        )
     for account in accounts:
+        counter = counters.get(account.id)
+        progress = f" {counter.sent}/{counter.total}" if counter and counter.total else ""
         builder.button(
-            text=f"{'❇️' if account.is_connected else '⛔️'}{'🟢' if account.is_started else '🔴'} {account.phone} ({account.name or '?'})",
+            text=f"{'❇️' if account.is_connected else '⛔️'}{'🟢' if account.is_started else '🔴'} {account.phone} ({account.name or '?'}){progress}",
             callback_data=AccountFactory(id=account.id),
         )
     builder.button(text=BACK_BUTTON_TEXT, callback_data=BackFactory(to=back_to))
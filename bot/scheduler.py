@@ -1,13 +1,21 @@
 import asyncio
+import bisect
+import collections
+import dataclasses
 import datetime
+import enum
 import functools
+import heapq
+import itertools
 import logging
 import random
 import re
+import time
 import warnings
 from collections.abc import Callable, Hashable
 
 logger = logging.getLogger("schedule")
+metrics_logger = logging.getLogger("schedule.metrics")
 
 
 class ScheduleError(Exception):
@@ -26,17 +34,195 @@ class CancelJob:
     """Can be returned from a job to unschedule itself."""
 
 
-class Scheduler:
+@dataclasses.dataclass(frozen=True)
+class RetryPolicy:
+    max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    jitter: float = 0.5  # fraction of the delay that is randomized
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay * (1 - self.jitter), delay)
+
+
+@dataclasses.dataclass
+class JobStats:
+    runs: int = 0
+    skipped: int = 0  # fires dropped because max_instances runs were active
+    coalesced: int = 0  # missed fires collapsed into a single run
+    failures: int = 0
+    timeouts: int = 0
+    retries: int = 0
+    consecutive_failures: int = 0
+    breaker_trips: int = 0
+    last_error: None | str = None
+    last_failure: None | datetime.datetime = None
+    claims_lost: int = 0  # due fires taken by another replica
+
+
+class Priority(enum.IntEnum):
+    DELIVERY = 0  # user-facing work goes first
+    DEFAULT = 50
+    HOUSEKEEPING = 100
+
+
+class PriorityLimiter:
+    """Caps the number of running jobs; waiters are admitted by priority."""
+
+    def __init__(self, limit: int) -> None:
+        if limit < 1:
+            msg = "Concurrency limit should be at least 1"
+            raise ScheduleValueError(msg)
+        self.limit = limit
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(not fut.done() for _, _, fut in self._waiters)
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.limit:
+            self.active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        # the slot is handed over to the next waiter, so `active` stays the same
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+class Histogram:
+    """Cumulative histogram of durations in seconds over fixed buckets."""
+
+    bounds: tuple[float, ...] = (
+        0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf")
+    )  # fmt: skip
+
     def __init__(self) -> None:
+        self.buckets: list[int] = [0] * len(self.bounds)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        value = max(value, 0.0)
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+            "buckets": dict(zip(self.bounds, self.buckets)),
+        }
+
+
+@dataclasses.dataclass
+class TagMetrics:
+    lag: Histogram = dataclasses.field(default_factory=Histogram)
+    duration: Histogram = dataclasses.field(default_factory=Histogram)
+    outcomes: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+
+
+class JobStore:
+    """Keeps job state in process memory; subclasses persist it and make sure
+    that every due fire is claimed by exactly one scheduler replica."""
+
+    async def add_job(self, job: "Job") -> None:
+        pass
+
+    async def remove_job(self, job: "Job") -> None:
+        pass
+
+    async def claim(
+        self, job: "Job", fire_at: datetime.datetime, next_run: datetime.datetime
+    ) -> bool:
+        return True
+
+    async def load(self, job: "Job") -> None:
+        pass
+
+    async def save(self, job: "Job") -> None:
+        pass
+
+
+class Scheduler:
+    def __init__(
+        self, store: None | JobStore = None, max_concurrency: None | int = None
+    ) -> None:
         self.jobs: list[Job] = []
+        self.store: JobStore = store or JobStore()
+        self.limiter: None | PriorityLimiter = None
+        if max_concurrency is not None:
+            self.limit_concurrency(max_concurrency)
+        self._unsynced: list[Job] = []
+        self._removed: list[Job] = []
+        # min-heap of [deadline, seq, job] entries keyed by monotonic deadline;
+        # cancelled or rescheduled entries get their job slot set to None
+        self._queue: list[list] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+        self._metrics: collections.defaultdict[str, TagMetrics] = (
+            collections.defaultdict(TagMetrics)
+        )
 
     async def run_pending(self, *args, **kwargs):
-        jobs = [asyncio.create_task(job.run()) for job in self.jobs if job.should_run]
+        jobs = [
+            asyncio.create_task(self._run_job(job, scheduled))
+            for job, scheduled in await self._dispatch_due(time.monotonic())
+        ]
         if not jobs:
             return [], []
         done, pending = await asyncio.wait(jobs, *args, **kwargs)
         return done, pending
 
+    async def run_forever(self) -> None:
+        while True:
+            self._wakeup.clear()
+            for job, scheduled in await self._dispatch_due(time.monotonic()):
+                task = asyncio.create_task(self._run_job(job, scheduled))
+                self._tasks.add(task)
+                task.add_done_callback(self._on_task_done)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle_seconds)
+            except TimeoutError:
+                pass
+
     async def run_all(self, delay_seconds: int = 0, *args, **kwargs):
         if delay_seconds:
             warnings.warn(
@@ -44,12 +230,44 @@ class Scheduler:
                 DeprecationWarning,
                 stacklevel=2,
             )
-        jobs = [asyncio.create_task(self._run_job(job)) for job in self.jobs[:]]
+        await self._sync_store()
+        now = time.monotonic()
+        runnable = []
+        for job in self.jobs[:]:
+            job._schedule_next_run()
+            self._reschedule(job)
+            await self._save(job)
+            if self._reserve_instance(job):
+                runnable.append(job)
+        runnable.sort(key=lambda job: job.priority_class)
+        jobs = [asyncio.create_task(self._run_job(job, now)) for job in runnable]
         if not jobs:
             return [], []
         done, pending = await asyncio.wait(jobs, *args, **kwargs)
         return done, pending
 
+    def limit_concurrency(self, max_concurrency: int) -> None:
+        self.limiter = PriorityLimiter(max_concurrency)
+
+    def use_store(self, store: JobStore) -> None:
+        self.store = store
+        self._unsynced = self.jobs[:]
+        self._wakeup.set()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "job": str(job),
+                "tags": sorted(map(str, job.tags)),
+                "next_run": job.next_run,
+                "last_run": job.last_run,
+                "running": job._running,
+                "priority": job.priority_class,
+                **dataclasses.asdict(job.stats),
+            }
+            for job in self.jobs
+        ]
+
     def get_jobs(self, tag: None | Hashable = None) -> list["Job"]:
         if tag is None:
             return self.jobs[:]
@@ -58,10 +276,21 @@ class Scheduler:
     def clear(self, tag: None | Hashable = None) -> None:
         if tag is None:
             logger.info("Deleting *all* jobs")
+            for job in self.jobs:
+                job._registered = False
+                job._entry = None
+            self._removed.extend(self.jobs)
             del self.jobs[:]
+            del self._queue[:]
         else:
             logger.info('Deleting all jobs tagged "%s"', tag)
+            for job in self.jobs:
+                if tag in job.tags:
+                    job._registered = False
+                    self._discard(job)
+                    self._removed.append(job)
             self.jobs[:] = (job for job in self.jobs if tag not in job.tags)
+        self._wakeup.set()
 
     def cancel_job(self, job: "Job") -> None:
         try:
@@ -69,17 +298,236 @@ class Scheduler:
             self.jobs.remove(job)
         except ValueError:
             logger.info('Cancelling not-scheduled job "%s"', str(job))
+        if job._registered:
+            self._removed.append(job)
+        job._registered = False
+        self._discard(job)
+        self._wakeup.set()
+
+    def metrics(self) -> dict[str, dict]:
+        return {
+            tag: {
+                "lag": metrics.lag.as_dict(),
+                "duration": metrics.duration.as_dict(),
+                "outcomes": dict(metrics.outcomes),
+            }
+            for tag, metrics in self._metrics.items()
+        }
+
+    async def log_metrics(self) -> None:
+        for tag, metrics in sorted(self._metrics.items()):
+            lag, duration = metrics.lag, metrics.duration
+            metrics_logger.info(
+                "%s: runs=%s lag p50=%.3fs p99=%.3fs max=%.3fs "
+                "duration p50=%.3fs p99=%.3fs max=%.3fs outcomes=%s",
+                tag,
+                duration.count,
+                lag.quantile(0.5),
+                lag.quantile(0.99),
+                lag.max,
+                duration.quantile(0.5),
+                duration.quantile(0.99),
+                duration.max,
+                dict(metrics.outcomes),
+            )
 
     def every(self, interval: int = 1) -> "Job":
         return Job(interval, self)
 
-    async def _run_job(self, job: "Job") -> None:
-        await job.run()
+    async def _run_job(self, job: "Job", scheduled: float) -> None:
+        limiter = self.limiter
+        if limiter is not None:
+            try:
+                await limiter.acquire(job.priority_class)
+            except asyncio.CancelledError:
+                job._running -= 1
+                raise
+        started = time.monotonic()
+        self._observe(job, "lag", started - scheduled)
+        outcome = "success"
+        try:
+            async with asyncio.timeout(job.run_timeout):
+                ret = await job.run()
+        except TimeoutError as exc:
+            outcome = "timeout"
+            job.stats.timeouts += 1
+            if self._on_failure(job, exc):
+                await self._save(job)
+            return
+        except Exception as exc:
+            outcome = "failure"
+            if self._on_failure(job, exc):
+                await self._save(job)
+            return
+        finally:
+            job._running -= 1
+            if limiter is not None:
+                limiter.release()
+            self._observe(job, "duration", time.monotonic() - started)
+            self._count(job, outcome)
+        job.stats.consecutive_failures = 0
+        if isinstance(ret, CancelJob) or ret is CancelJob:
+            if job._registered:
+                self.cancel_job(job)
+
+    def _metric_keys(self, job: "Job") -> list[str]:
+        return [str(tag) for tag in job.tags] or [str(job.job_id)]
+
+    def _observe(self, job: "Job", name: str, value: float) -> None:
+        for key in self._metric_keys(job):
+            getattr(self._metrics[key], name).observe(value)
+
+    def _count(self, job: "Job", outcome: str) -> None:
+        for key in self._metric_keys(job):
+            self._metrics[key].outcomes[outcome] += 1
+
+    def _on_failure(self, job: "Job", exc: BaseException) -> bool:
+        stats = job.stats
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        stats.last_error = repr(exc)
+        stats.last_failure = datetime.datetime.now()
+        logger.error(
+            "Job %s failed (%s in a row)",
+            job,
+            stats.consecutive_failures,
+            exc_info=exc,
+        )
+        breaker = job.breaker_threshold
+        if breaker is not None and stats.consecutive_failures >= breaker:
+            stats.breaker_trips += 1
+            logger.error(
+                "Circuit opened for %s for %s seconds", job, job.breaker_cooldown
+            )
+            job._delay_next_run(job.breaker_cooldown)
+            self._reschedule(job)
+            return True
+        policy = job.retry_policy
+        if policy is not None and stats.consecutive_failures <= policy.max_retries:
+            stats.retries += 1
+            job._delay_next_run(policy.delay(stats.consecutive_failures))
+            self._reschedule(job)
+            return True
+        return False
+
+    async def _dispatch_due(self, now: float) -> list[tuple["Job", float]]:
+        await self._sync_store()
+        runnable = []
+        for job in self._pop_due(now):
+            fire_at, scheduled = job.next_run, job._deadline
+            coalesced = 0
+            missed = job._missed_fires(now)
+            if job.coalesce or missed == 1:
+                coalesced = missed - 1
+                job._schedule_next_run()
+            else:
+                job._advance_next_run()
+            claimed = await self._claim(job, fire_at)
+            self._reschedule(job)
+            if not claimed:
+                continue
+            job.stats.coalesced += coalesced
+            if self._reserve_instance(job):
+                runnable.append((job, scheduled))
+        runnable.sort(key=lambda item: item[0].priority_class)
+        return runnable
+
+    async def _claim(self, job: "Job", fire_at: datetime.datetime) -> bool:
+        if not job.shared:
+            return True
+        try:
+            if await self.store.claim(job, fire_at, job.next_run):
+                return True
+            job.stats.claims_lost += 1
+            await self.store.load(job)
+        except Exception:
+            logger.exception("Job store is unavailable, skipping fire of %s", job)
+        return False
+
+    async def _save(self, job: "Job") -> None:
+        if not job.shared:
+            return
+        try:
+            await self.store.save(job)
+        except Exception:
+            logger.exception("Unable to persist %s", job)
+
+    async def _sync_store(self) -> None:
+        while self._removed:
+            job = self._removed.pop()
+            if not job.shared:
+                continue
+            try:
+                await self.store.remove_job(job)
+            except Exception:
+                logger.exception("Unable to remove %s from the job store", job)
+        while self._unsynced:
+            job = self._unsynced.pop()
+            if not job._registered or not job.shared:
+                continue
+            deadline = job._deadline
+            try:
+                await self.store.add_job(job)
+            except Exception:
+                logger.exception("Unable to add %s to the job store", job)
+            if job._deadline != deadline:
+                self._reschedule(job)
+
+    def _reserve_instance(self, job: "Job") -> bool:
+        # queued runs count as running, so a backlog behind the limiter
+        # cannot pile up more than max_instances runs of one job
+        if job._running < job.max_instances:
+            job._running += 1
+            return True
+        job.stats.skipped += 1
+        self._count(job, "skipped")
+        logger.warning(
+            "Skipping run of %s: %s instance(s) still running", job, job._running
+        )
+        return False
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Job raised", exc_info=task.exception())
+
+    def _reschedule(self, job: "Job") -> None:
+        if job._registered:
+            self._push(job)
+
+    def _push(self, job: "Job") -> None:
+        self._discard(job)
+        entry = [job._deadline, next(self._counter), job]
+        job._entry = entry
+        heapq.heappush(self._queue, entry)
+        self._wakeup.set()
+
+    def _discard(self, job: "Job") -> None:
+        if job._entry is not None:
+            job._entry[-1] = None
+            job._entry = None
+
+    def _peek(self) -> None | list:
+        while self._queue and self._queue[0][-1] is None:
+            heapq.heappop(self._queue)
+        return self._queue[0] if self._queue else None
+
+    def _pop_due(self, now: float) -> list["Job"]:
+        due = []
+        while (entry := self._peek()) is not None and entry[0] <= now:
+            heapq.heappop(self._queue)
+            job = entry[-1]
+            job._entry = None
+            due.append(job)
+        return due
 
     @property
     def get_next_run(self, tag: None | Hashable = None) -> None | datetime.datetime:
         if not self.jobs:
             return None
+        if tag is None:
+            entry = self._peek()
+            return entry[-1].next_run if entry is not None else None
         jobs_filtered = self.get_jobs(tag)
         if not jobs_filtered:
             return None
@@ -87,9 +535,10 @@ class Scheduler:
 
     @property
     def idle_seconds(self) -> None | float:
-        if not self.get_next_run:
+        entry = self._peek()
+        if entry is None:
             return None
-        return (self.get_next_run - datetime.datetime.now()).total_seconds()
+        return entry[0] - time.monotonic()
 
 
 class Job:
@@ -105,7 +554,21 @@ class Job:
         self.start_day: None | str = None
         self.cancel_after: None | datetime.datetime = None
         self.tags: set = set()
+        self.job_id: None | str = None
+        self.shared: bool = True  # False keeps the job out of the job store
+        self.priority_class: int = Priority.DEFAULT
+        self.max_instances: int = 1
+        self.coalesce: bool = True
+        self.run_timeout: None | float = None
+        self.retry_policy: None | RetryPolicy = None
+        self.breaker_threshold: None | int = None
+        self.breaker_cooldown: float = 0.0
+        self.stats = JobStats()
         self.scheduler: None | Scheduler = scheduler
+        self._deadline: float = 0.0  # monotonic counterpart of next_run
+        self._entry: None | list = None
+        self._registered: bool = False
+        self._running: int = 0
 
     def __lt__(self, other):
         return self.next_run < other.next_run
@@ -276,6 +739,18 @@ class Job:
         self.start_day = "sunday"
         return self.weeks
 
+    def named(self, job_id: str):
+        self.job_id = job_id
+        return self
+
+    def priority(self, priority_class: int):
+        self.priority_class = priority_class
+        return self
+
+    def local(self):
+        self.shared = False
+        return self
+
     def tag(self, *tags: Hashable):
         if not all(isinstance(tag, Hashable) for tag in tags):
             msg = "Tags must be hashable"
@@ -283,6 +758,42 @@ class Job:
         self.tags.update(tags)
         return self
 
+    def overlap(self, max_instances: int = 1, coalesce: bool = True):
+        if max_instances < 1:
+            msg = "`max_instances` should be at least 1"
+            raise ScheduleValueError(msg)
+        self.max_instances = max_instances
+        self.coalesce = coalesce
+        return self
+
+    def timeout(self, seconds: float):
+        if seconds <= 0:
+            msg = "Timeout should be positive"
+            raise ScheduleValueError(msg)
+        self.run_timeout = seconds
+        return self
+
+    def retry(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        jitter: float = 0.5,
+    ):
+        if not (0 <= jitter <= 1):
+            msg = "`jitter` should be between 0 and 1"
+            raise ScheduleValueError(msg)
+        self.retry_policy = RetryPolicy(max_retries, base_delay, max_delay, jitter)
+        return self
+
+    def circuit_breaker(self, threshold: int = 5, cooldown: float = 300.0):
+        if threshold < 1:
+            msg = "`threshold` should be at least 1"
+            raise ScheduleValueError(msg)
+        self.breaker_threshold = threshold
+        self.breaker_cooldown = cooldown
+        return self
+
     def at(self, time_str: str, tz: None | str = None):
         if self.unit not in ("days", "hours", "minutes") and not self.start_day:
             msg = "Invalid unit (valid units are `days`, `hours`, and `minutes`)"
@@ -404,6 +915,8 @@ class Job:
     def do(self, job_func: Callable, *args, **kwargs):
         self.job_func = functools.partial(job_func, *args, **kwargs)
         functools.update_wrapper(self.job_func, job_func)
+        if self.job_id is None:
+            self.job_id = f"{job_func.__module__}.{job_func.__qualname__}"
         self._schedule_next_run()
         if self.scheduler is None:
             msg = "Unable to a add job to schedule. Job is not associated with an scheduler"
@@ -411,6 +924,9 @@ class Job:
                 msg
             )
         self.scheduler.jobs.append(self)
+        self.scheduler._unsynced.append(self)
+        self._registered = True
+        self.scheduler._push(self)
         return self
 
     @property
@@ -423,12 +939,12 @@ class Job:
             logger.info("Cancelling job %s", self)
             return CancelJob
         logger.info("Running job %s", self)
+        self.stats.runs += 1
         ret = await self.job_func()
         if isinstance(ret, CancelJob) or ret is CancelJob:
             self.scheduler.cancel_job(self)
             return ret
         self.last_run = datetime.datetime.now()
-        self._schedule_next_run()
         if self._is_overdue(self.next_run):
             logger.info("Cancelling job %s", self)
             return CancelJob
@@ -467,7 +983,30 @@ class Job:
         if self.at_time_zone is not None:
             next_run = next_run.astimezone()
             next_run = next_run.replace(tzinfo=None)
+        self._set_next_run(next_run)
+
+    def _period(self) -> datetime.timedelta:
+        return datetime.timedelta(**{self.unit: self.interval})
+
+    def _missed_fires(self, now: float) -> int:
+        period = self._period().total_seconds()
+        return int((now - self._deadline) // period) + 1
+
+    def _delay_next_run(self, seconds: float) -> None:
+        self._set_next_run(
+            datetime.datetime.now() + datetime.timedelta(seconds=seconds)
+        )
+
+    def _set_next_run(self, next_run: datetime.datetime) -> None:
         self.next_run = next_run
+        self._deadline = (
+            time.monotonic() + (next_run - datetime.datetime.now()).total_seconds()
+        )
+
+    def _advance_next_run(self) -> None:
+        period = self._period()
+        self.next_run += period
+        self._deadline += period.total_seconds()
 
     def _move_to_at_time(self, moment: datetime.datetime) -> datetime.datetime:
         if self.at_time is None:
@@ -31,6 +31,59 @@ class Settings:
         "/home/max/Desktop/post_account/start_bot.sh",
     )
     sep = os.environ.get("SEP", "\n")
+    scheduler_concurrency = int(os.environ.get("SCHEDULER_CONCURRENCY", 20))
+    job_answers_sweep_seconds = int(os.environ.get("JOB_ANSWERS_SWEEP_SECONDS", 60))
+    job_answers_chunk_size = int(os.environ.get("JOB_ANSWERS_CHUNK_SIZE", 50))
+    # a sweep stops taking chunks after this; keep it well under its timeout
+    job_answers_sweep_budget_seconds = float(
+        os.environ.get("JOB_ANSWERS_SWEEP_BUDGET_SECONDS", 30)
+    )
+    job_answers_lease_seconds = int(os.environ.get("JOB_ANSWERS_LEASE_SECONDS", 300))
+    # answers longer than this many characters are sent as a document
+    job_answers_document_threshold = int(
+        os.environ.get("JOB_ANSWERS_DOCUMENT_THRESHOLD", 16_000)
+    )
+    # answers above this many bytes are decoded in a worker thread
+    job_answers_offload_bytes = int(
+        os.environ.get("JOB_ANSWERS_OFFLOAD_BYTES", 256 * 1024)
+    )
+    job_answers_max_bytes = int(
+        os.environ.get("JOB_ANSWERS_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    # failed deliveries are retried after base * 2**(attempt - 1) seconds
+    job_answers_max_attempts = int(os.environ.get("JOB_ANSWERS_MAX_ATTEMPTS", 8))
+    job_answers_retry_base_seconds = int(
+        os.environ.get("JOB_ANSWERS_RETRY_BASE_SECONDS", 60)
+    )
+    job_answers_retry_max_seconds = int(
+        os.environ.get("JOB_ANSWERS_RETRY_MAX_SECONDS", 6 * 60 * 60)
+    )
+    job_answers_retry_sweep_seconds = int(
+        os.environ.get("JOB_ANSWERS_RETRY_SWEEP_SECONDS", 120)
+    )
+    # >0 merges the answers of one user into a digest sent this often
+    job_answers_digest_seconds = int(os.environ.get("JOB_ANSWERS_DIGEST_SECONDS", 0))
+    usernames_insert_chunk_size = int(
+        os.environ.get("USERNAMES_INSERT_CHUNK_SIZE", 1000)
+    )
+    username_counters_reconcile_minutes = int(
+        os.environ.get("USERNAME_COUNTERS_RECONCILE_MINUTES", 30)
+    )
+    # sent usernames older than this move to usernames_archive
+    usernames_archive_after_days = int(
+        os.environ.get("USERNAMES_ARCHIVE_AFTER_DAYS", 30)
+    )
+    usernames_archive_batch_size = int(
+        os.environ.get("USERNAMES_ARCHIVE_BATCH_SIZE", 1000)
+    )
+    usernames_archive_max_batches = int(
+        os.environ.get("USERNAMES_ARCHIVE_MAX_BATCHES", 50)
+    )
+    usernames_archive_minutes = int(os.environ.get("USERNAMES_ARCHIVE_MINUTES", 60))
+    delivery_concurrency = int(os.environ.get("DELIVERY_CONCURRENCY", 8))
+    # Bot API allows about 30 messages per second overall and 1 per chat
+    delivery_rate = float(os.environ.get("DELIVERY_RATE", 25))
+    delivery_chat_interval = float(os.environ.get("DELIVERY_CHAT_INTERVAL", 1))
 
     db: DBSettings = DBSettings()
     redis: RedisSettings = RedisSettings()
@@ -16,6 +16,7 @@ class AccountState(StatesGroup):
 
 class FolderState(StatesGroup):
     enter_name = State()
+    load_nicks = State()
 
 
 class AccountTextsState(StatesGroup):
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+import csv
 import dataclasses
 import logging
+import mmap
 import os
 import re
 import signal
 import subprocess
 from pathlib import Path
-from typing import Awaitable, Callable, Final
+from typing import Awaitable, Callable, Final, Iterator, Sequence
 
+import numpy as np
 import psutil
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
@@ -30,6 +33,8 @@ logger = logging.getLogger(__name__)
 PID_SUFFIX: Final[str] = ".pid"
 SESSION_SUFFIX: Final[str] = ".session"
 PID_FILE_WAIT_SECONDS: Final[float] = 1.0
+MMAP_MIN_BYTES: Final[int] = 1024 * 1024
+REJECTED_SAMPLE_SIZE: Final[int] = 20
 USERNAME_PATTERN: Final = re.compile(r"^[A-Za-z0-9_]{5,32}$")
 
 
@@ -45,6 +50,17 @@ class UserData:
     item_name: str
 
 
+@dataclasses.dataclass
+class RejectedLines:
+    count: int = 0
+    sample: list[str] = dataclasses.field(default_factory=list)
+
+    def add(self, line: str) -> None:
+        self.count += 1
+        if len(self.sample) < REJECTED_SAMPLE_SIZE:
+            self.sample.append(line)
+
+
 def _pid_file(phone: str) -> Path:
     return Path(se.path_to_folder) / f"{phone}{PID_SUFFIX}"
 
@@ -71,6 +87,20 @@ class Function:
             return None
         return username
 
+    @staticmethod
+    def _parse_user_fields(item_name: str, raw_username: str) -> UserData | None:
+        username = Function._validate_username(raw_username)
+        if not username:
+            return None
+        return UserData(username, item_name.strip())
+
+    @staticmethod
+    def parse_user_line(line: str) -> UserData | None:
+        r = line.split("-", maxsplit=1)
+        if not r or len(r) < 2:
+            return None
+        return Function._parse_user_fields(r[0], r[1])
+
     @staticmethod
     async def parse_users_from_text(text: str) -> tuple[list[UserData], list[str]]:
         lines = text.splitlines()
@@ -79,18 +109,93 @@ class Function:
         for line in lines:
             if not line or not line.strip():
                 continue
-            r = line.split("-", maxsplit=1)
-            if not r or len(r) < 2:
+            user = Function.parse_user_line(line)
+            if not user:
                 line_not_handled.append(line)
                 continue
-            item_name = r[0].strip()
-            username = Function._validate_username(r[1])
-            if not username:
-                line_not_handled.append(line)
-                continue
-            users.append(UserData(username, item_name))
+            users.append(user)
         return users, line_not_handled
 
+    @staticmethod
+    def iter_file_lines(path: str) -> Iterator[str]:
+        """Reads a file line by line; big files are mapped instead of being
+        read through the buffered reader."""
+        if os.path.getsize(path) < MMAP_MIN_BYTES:
+            with open(path, encoding="utf-8-sig", errors="replace") as fh:
+                for line in fh:
+                    yield line.rstrip("\r\n")
+            return
+        with (
+            open(path, "rb") as fh,
+            mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+        ):
+            for raw in iter(mm.readline, b""):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                yield line.lstrip("\ufeff")
+
+    @staticmethod
+    def iter_users_from_file(
+        path: str, rejected: RejectedLines, is_csv: bool = False
+    ) -> Iterator[UserData]:
+        """Streams users from a `item - username` list or a two column
+        `item,username` csv; unparsed lines are collected into `rejected`."""
+        lines = Function.iter_file_lines(path)
+        if is_csv:
+            for index, row in enumerate(csv.reader(lines)):
+                if not row or not any(field.strip() for field in row):
+                    continue
+                if index == 0 and len(row) >= 2 and row[1].strip() == "username":
+                    continue
+                user = (
+                    Function._parse_user_fields(row[0], row[1])
+                    if len(row) >= 2
+                    else None
+                )
+                if user:
+                    yield user
+                else:
+                    rejected.add(",".join(row))
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            user = Function.parse_user_line(line)
+            if user:
+                yield user
+            else:
+                rejected.add(line)
+
+    @staticmethod
+    def split_by_weight(
+        total: int, weights: Sequence[int], backlog: Sequence[int] | None = None
+    ) -> list[int]:
+        """Splits `total` items between queues draining `weights` items per
+        cycle so that, counting their `backlog`, they all run dry together.
+
+        Water filling: queues already behind the common level get nothing,
+        the rest are topped up to it; shares are rounded by largest
+        remainder so they sum to `total`."""
+        w = np.asarray(weights, dtype=np.float64)
+        if not len(w) or (w <= 0).any():
+            raise ValueError("weights must be positive")
+        if not total:
+            return [0] * len(w)
+        b = np.zeros_like(w) if backlog is None else np.asarray(backlog, np.float64)
+        # cycles each queue needs for its backlog, ascending
+        order = np.argsort(b / w, kind="stable")
+        ratios = (b / w)[order]
+        levels = (total + np.cumsum(b[order])) / np.cumsum(w[order])
+        # the level with k queues filled is valid while it is above all k ratios
+        k = int(np.flatnonzero(levels > ratios)[-1]) + 1
+        shares = np.zeros_like(w)
+        filled = order[:k]
+        shares[filled] = np.maximum(levels[k - 1] * w[filled] - b[filled], 0)
+        counts = np.floor(shares).astype(np.int64)
+        rest = total - int(counts.sum())
+        if rest > 0:
+            counts[np.argsort(counts - shares, kind="stable")[:rest]] += 1
+        return counts.tolist()
+
     @staticmethod
     async def set_general_message(state: FSMContext, message: Message) -> None:
         data_state = await state.get_data()
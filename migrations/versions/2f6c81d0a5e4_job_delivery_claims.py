@@ -0,0 +1,33 @@
+"""add delivery claim columns to jobs
+
+Revision ID: 2f6c81d0a5e4
+Revises: 9a4e7d21b6c3
+Create Date: 2026-10-17 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2f6c81d0a5e4"
+down_revision = "9a4e7d21b6c3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "jobs", sa.Column("claimed_by", sa.String(length=64), nullable=True)
+    )
+    op.add_column("jobs", sa.Column("claimed_until", sa.DateTime(), nullable=True))
+    op.add_column(
+        "jobs",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "attempts")
+    op.drop_column("jobs", "claimed_until")
+    op.drop_column("jobs", "claimed_by")
@@ -0,0 +1,24 @@
+"""add next_attempt_at to jobs for dead letters
+
+Revision ID: 5d3b9e07c2a1
+Revises: 2f6c81d0a5e4
+Create Date: 2026-10-17 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5d3b9e07c2a1"
+down_revision = "2f6c81d0a5e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "next_attempt_at")
@@ -0,0 +1,62 @@
+"""add usernames.username_key with a unique index per account
+
+Revision ID: 8c1e4f6a2d93
+Revises: 5d3b9e07c2a1
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8c1e4f6a2d93"
+down_revision = "5d3b9e07c2a1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "usernames", sa.Column("username_key", sa.String(length=100), nullable=True)
+    )
+    op.execute("UPDATE usernames SET username_key = LOWER(username)")
+    # a sent row wins over queued copies of the same username, otherwise the
+    # oldest row is kept; derived tables keep MySQL from rejecting the
+    # self-referencing subqueries
+    op.execute(
+        """
+        DELETE FROM usernames
+        WHERE sended = 0 AND (account_id, username_key) IN (
+            SELECT account_id, username_key FROM (
+                SELECT account_id, username_key FROM usernames WHERE sended = 1
+            ) AS sent
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM usernames
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT MIN(id) AS id FROM usernames
+                GROUP BY account_id, username_key
+            ) AS keep
+        )
+        """
+    )
+    with op.batch_alter_table("usernames") as batch:
+        batch.alter_column(
+            "username_key", existing_type=sa.String(length=100), nullable=False
+        )
+    op.create_index(
+        "uq_usernames_account_key",
+        "usernames",
+        ["account_id", "username_key"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_usernames_account_key", table_name="usernames")
+    op.drop_column("usernames", "username_key")
@@ -0,0 +1,35 @@
+"""add indexed jobs.status
+
+Revision ID: 9a4e7d21b6c3
+Revises: e6b1a1b79e9d
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9a4e7d21b6c3"
+down_revision = "e6b1a1b79e9d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "jobs",
+        sa.Column(
+            "status",
+            sa.SmallInteger(),
+            nullable=False,
+            server_default="0",
+        ),
+    )
+    op.execute("UPDATE jobs SET status = 1 WHERE answer IS NOT NULL")
+    op.create_index("ix_jobs_status_id", "jobs", ["status", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_status_id", table_name="jobs")
+    op.drop_column("jobs", "status")
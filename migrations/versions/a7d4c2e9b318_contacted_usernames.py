@@ -0,0 +1,56 @@
+"""add contacted_usernames
+
+Revision ID: a7d4c2e9b318
+Revises: f1c9a3b7e520
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7d4c2e9b318"
+down_revision = "f1c9a3b7e520"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "contacted_usernames",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("username_key", sa.String(length=100), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "uq_contacted_usernames_user_key",
+        "contacted_usernames",
+        ["user_id", "username_key"],
+        unique=True,
+    )
+    # UNION drops the names queued on several accounts of the same user
+    op.execute(
+        """
+        INSERT INTO contacted_usernames (user_id, username_key)
+        SELECT accounts.user_id, usernames.username_key
+        FROM usernames JOIN accounts ON accounts.id = usernames.account_id
+        WHERE accounts.user_id IS NOT NULL
+        UNION
+        SELECT accounts.user_id, usernames_archive.username_key
+        FROM usernames_archive
+        JOIN accounts ON accounts.id = usernames_archive.account_id
+        WHERE accounts.user_id IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_contacted_usernames_user_key", table_name="contacted_usernames")
+    op.drop_table("contacted_usernames")
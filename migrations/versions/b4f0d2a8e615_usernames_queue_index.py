@@ -0,0 +1,27 @@
+"""add (account_id, sended, id) index on usernames
+
+Revision ID: b4f0d2a8e615
+Revises: 8c1e4f6a2d93
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b4f0d2a8e615"
+down_revision = "8c1e4f6a2d93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_usernames_account_sended_id",
+        "usernames",
+        ["account_id", "sended", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usernames_account_sended_id", table_name="usernames")
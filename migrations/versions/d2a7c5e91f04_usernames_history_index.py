@@ -0,0 +1,23 @@
+"""add (account_id, id) index on usernames for history pages
+
+Revision ID: d2a7c5e91f04
+Revises: b4f0d2a8e615
+Create Date: 2026-10-17 17:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "d2a7c5e91f04"
+down_revision = "b4f0d2a8e615"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_usernames_account_id", "usernames", ["account_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usernames_account_id", table_name="usernames")
@@ -0,0 +1,48 @@
+"""add username_counters
+
+Revision ID: e8b3f1c6d207
+Revises: d2a7c5e91f04
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e8b3f1c6d207"
+down_revision = "d2a7c5e91f04"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "username_counters",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("pending", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sent", sa.Integer(), nullable=False, server_default="0"),
+        sa.ForeignKeyConstraint(
+            ["account_id"],
+            ["accounts.id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("account_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO username_counters (account_id, pending, sent)
+        SELECT account_id,
+               SUM(CASE WHEN sended THEN 0 ELSE 1 END),
+               SUM(CASE WHEN sended THEN 1 ELSE 0 END)
+        FROM usernames
+        WHERE account_id IN (SELECT id FROM accounts)
+        GROUP BY account_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("username_counters")
@@ -0,0 +1,72 @@
+"""add usernames_archive and usernames.sended_at
+
+Revision ID: f1c9a3b7e520
+Revises: e8b3f1c6d207
+Create Date: 2026-10-17 18:30:00.000000
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f1c9a3b7e520"
+down_revision = "e8b3f1c6d207"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("usernames", sa.Column("sended_at", sa.DateTime(), nullable=True))
+    # the real send time of older rows is unknown, they age from now on
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    op.execute(
+        sa.text("UPDATE usernames SET sended_at = :now WHERE sended = 1").bindparams(
+            now=now
+        )
+    )
+    op.create_index(
+        "ix_usernames_sended_at", "usernames", ["sended", "sended_at"]
+    )
+    op.create_table(
+        "usernames_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("account_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(length=100), nullable=False),
+        sa.Column("username_key", sa.String(length=100), nullable=False),
+        sa.Column("item_name", sa.String(length=100), nullable=False),
+        sa.Column("sended_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["account_id"],
+            ["accounts.id"],
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "uq_usernames_archive_account_key",
+        "usernames_archive",
+        ["account_id", "username_key"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_usernames_archive_account_id",
+        "usernames_archive",
+        ["account_id", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        INSERT INTO usernames
+            (id, account_id, username, username_key, item_name, sended, sended_at)
+        SELECT id, account_id, username, username_key, item_name, 1, sended_at
+        FROM usernames_archive
+        """
+    )
+    op.drop_table("usernames_archive")
+    op.drop_index("ix_usernames_sended_at", table_name="usernames")
+    op.drop_column("usernames", "sended_at")